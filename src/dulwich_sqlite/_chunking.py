@@ -1,9 +1,10 @@
 """Content-defined chunking for blob deduplication."""
 
+import functools
 import hashlib
+import os
 import zlib
-
-from fastcdc import fastcdc
+from concurrent.futures import ThreadPoolExecutor
 
 CHUNKING_THRESHOLD = 4096
 TEXT_CDC_MASK = 0x7  # cut when crc32(line) & MASK == 0 → ~8-line avg chunks
@@ -12,84 +13,128 @@ TEXT_MAX_CHUNK_BYTES = 4096
 BINARY_AVG_SIZE = 8192
 BINARY_MIN_SIZE = 2048
 BINARY_MAX_SIZE = 65536
+# Blobs at least this large hash their chunks on a thread pool; hashlib
+# releases the GIL for inputs >= 2 KiB, which every binary chunk is.
+PARALLEL_HASH_THRESHOLD = 256 * 1024
 
 
 def is_text(data: bytes) -> bool:
     """Return True if data looks like text (no null bytes in first 8000 bytes)."""
-    return b"\x00" not in data[:8000]
+    return data.find(b"\x00", 0, 8000) == -1
 
 
 def _sha256_bin(data: bytes) -> bytes:
-    return hashlib.sha256(data).digest()
+    return hashlib.sha256(data, usedforsecurity=False).digest()
+
+
+@functools.cache
+def _fastcdc():
+    """Import fastcdc on first use.
+
+    The package import pulls in click for its CLI (~40 ms), which repos
+    that never store a large binary blob should not pay for.  It resolves
+    to the compiled Cython scanner (fastcdc_cy) when the wheel ships it.
+    """
+    from fastcdc import fastcdc
+
+    return fastcdc
+
+
+@functools.cache
+def thread_pool() -> ThreadPoolExecutor:
+    """Return the shared thread pool used for parallel chunk hashing and decompression."""
+    return ThreadPoolExecutor(
+        max_workers=os.cpu_count() or 1,
+        thread_name_prefix="dulwich-sqlite",
+    )
+
+
+def _hash_spans(
+    data: bytes,
+    offsets: list[int],
+    parallel: bool = False,
+) -> list[tuple[bytes, memoryview]]:
+    """Slice and hash consecutive spans of data in one pass.
 
+    ``offsets`` holds the end offset of each chunk; chunk ``i`` spans
+    ``offsets[i - 1]:offsets[i]`` (starting at 0 for the first one).
+    With ``parallel`` set, digests are computed on the shared thread pool.
 
-def chunk_text(data: bytes) -> list[tuple[bytes, bytes]]:
+    Returns list of (sha256_digest, chunk_data) tuples, where chunk_data
+    is a zero-copy memoryview into ``data``.
+    """
+    view = memoryview(data)
+    views = [view[start:end] for start, end in zip([0, *offsets], offsets)]
+    if parallel and len(views) > 1 and (os.cpu_count() or 1) > 1:
+        digests = list(thread_pool().map(_sha256_bin, views))
+    else:
+        digests = [_sha256_bin(v) for v in views]
+    return list(zip(digests, views))
+
+
+def chunk_text(data: bytes) -> list[tuple[bytes, bytes | memoryview]]:
     """Split text data into chunks at line boundaries using CRC32.
 
+    Lines are located with ``bytes.find`` and only the chunk end offsets
+    are recorded; chunks are sliced and hashed afterwards by
+    ``_hash_spans``.
+
     Returns list of (sha256_digest, chunk_data) tuples.
     """
-    lines = data.split(b"\n")
-    # Re-attach newlines to each line (except possibly the last if no trailing newline)
-    parts: list[bytes] = []
-    for i, line in enumerate(lines):
-        if i < len(lines) - 1:
-            parts.append(line + b"\n")
-        elif line:  # last element, only include if non-empty
-            parts.append(line)
-
-    if not parts:
-        chunk_data = data
-        return [(_sha256_bin(chunk_data), chunk_data)]
-
-    chunks: list[tuple[str, bytes]] = []
-    current_lines: list[bytes] = []
-    current_bytes = 0
+    size = len(data)
+    if not size:
+        return [(_sha256_bin(data), data)]
+
+    view = memoryview(data)
+    offsets: list[int] = []
+    chunk_start = 0
+    line_start = 0
     line_count = 0
 
-    for part in parts:
-        current_lines.append(part)
-        current_bytes += len(part)
+    crc32 = zlib.crc32
+    find = data.find
+    while line_start < size:
+        # Each line keeps its trailing newline; the last may lack one
+        line_end = find(b"\n", line_start) + 1 or size
         line_count += 1
-        crc = zlib.crc32(part) & 0xFFFFFFFF
 
-        should_cut = (
+        # Only hash lines that could actually end a chunk; the first
+        # TEXT_MIN_LINES - 1 lines of every chunk can never be cut points.
+        if line_end - chunk_start >= TEXT_MAX_CHUNK_BYTES or (
             line_count >= TEXT_MIN_LINES
-            and (crc & TEXT_CDC_MASK) == 0
-        ) or current_bytes >= TEXT_MAX_CHUNK_BYTES
-
-        if should_cut:
-            chunk_data = b"".join(current_lines)
-            chunks.append((_sha256_bin(chunk_data), chunk_data))
-            current_lines = []
-            current_bytes = 0
+            and (crc32(view[line_start:line_end]) & TEXT_CDC_MASK) == 0
+        ):
+            offsets.append(line_end)
+            chunk_start = line_end
             line_count = 0
+        line_start = line_end
 
     # Flush remaining lines
-    if current_lines:
-        chunk_data = b"".join(current_lines)
-        chunks.append((_sha256_bin(chunk_data), chunk_data))
+    if chunk_start < size:
+        offsets.append(size)
 
-    return chunks
+    return _hash_spans(data, offsets)
 
 
-def chunk_binary(data: bytes) -> list[tuple[bytes, bytes]]:
+def chunk_binary(data: bytes) -> list[tuple[bytes, memoryview]]:
     """Split binary data into chunks using FastCDC.
 
-    Returns list of (sha256_digest, chunk_data) tuples.
+    Returns list of (sha256_digest, chunk_data) tuples. chunk_data is a
+    memoryview into ``data``, so no per-chunk copy is made.
     """
-    chunks: list[tuple[str, bytes]] = []
-    for chunk in fastcdc(
-        data,
-        min_size=BINARY_MIN_SIZE,
-        avg_size=BINARY_AVG_SIZE,
-        max_size=BINARY_MAX_SIZE,
-    ):
-        chunk_data = data[chunk.offset : chunk.offset + chunk.length]
-        chunks.append((_sha256_bin(chunk_data), chunk_data))
-    return chunks
-
-
-def chunk_blob(data: bytes) -> list[tuple[bytes, bytes]] | None:
+    offsets = [
+        chunk.offset + chunk.length
+        for chunk in _fastcdc()(
+            data,
+            min_size=BINARY_MIN_SIZE,
+            avg_size=BINARY_AVG_SIZE,
+            max_size=BINARY_MAX_SIZE,
+        )
+    ]
+    return _hash_spans(data, offsets, parallel=len(data) >= PARALLEL_HASH_THRESHOLD)
+
+
+def chunk_blob(data: bytes) -> list[tuple[bytes, bytes | memoryview]] | None:
     """Chunk blob data for deduplication.
 
     Returns None if the blob should be stored inline (too small or only one chunk).
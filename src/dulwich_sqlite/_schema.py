@@ -4,12 +4,37 @@ import sqlite3
 
 SCHEMA_VERSION = "1"
 
+# Size of the per-connection prepared-statement cache (sqlite3 default: 128).
+# Statements are cached by SQL text, so this must comfortably exceed the
+# number of distinct hot statements to avoid re-preparing them.
+CACHED_STATEMENTS = 256
+
+# Only takes effect before the first write, so it is applied by init_db
+# ahead of PRAGMAS (journal_mode=WAL writes the header).  A row stays on
+# its leaf page only up to about page_size - 35 bytes: with 8 KiB pages,
+# text chunks (TEXT_MAX_CHUNK_BYTES plus one line) usually fit without
+# overflow, and larger binary chunks spill into half as many overflow
+# pages as with the 4 KiB default.
+PAGE_SIZE = 8192
+
 PRAGMAS = [
     "PRAGMA journal_mode=WAL",
     "PRAGMA synchronous=NORMAL",
     "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-65536",  # 64 MiB page cache
+    "PRAGMA mmap_size=268435456",  # serve reads from a 256 MiB mapping
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA wal_autocheckpoint=2000",  # pages; fewer checkpoints during pack import
+    "PRAGMA journal_size_limit=67108864",  # truncate the WAL back to 64 MiB
 ]
 
+# Small key/value tables (refs, peeled_refs, metadata) are WITHOUT ROWID so
+# a lookup is a single B-tree probe.  chunks must keep its rowid: chunk_refs
+# and incremental BLOB reads address chunks by rowid.
+#
+# The GENERATED ... VIRTUAL columns below are neither stored nor computed
+# unless a query names them; they exist for ad-hoc SQL inspection (see
+# docs/querying.md).  Library code must only read the base columns.
 CREATE_TABLES = [
     """
     CREATE TABLE IF NOT EXISTS objects (
@@ -50,7 +75,7 @@ CREATE_TABLES = [
         value_hex TEXT GENERATED ALWAYS AS (hex(value)) VIRTUAL,
         name_text TEXT GENERATED ALWAYS AS (cast(name AS TEXT)) VIRTUAL,
         value_text TEXT GENERATED ALWAYS AS (cast(value AS TEXT)) VIRTUAL
-    )
+    ) WITHOUT ROWID
     """,
     """
     CREATE TABLE IF NOT EXISTS peeled_refs (
@@ -60,7 +85,7 @@ CREATE_TABLES = [
         value_hex TEXT GENERATED ALWAYS AS (hex(value)) VIRTUAL,
         name_text TEXT GENERATED ALWAYS AS (cast(name AS TEXT)) VIRTUAL,
         value_text TEXT GENERATED ALWAYS AS (cast(value AS TEXT)) VIRTUAL
-    )
+    ) WITHOUT ROWID
     """,
     """
     CREATE TABLE IF NOT EXISTS named_files (
@@ -72,7 +97,7 @@ CREATE_TABLES = [
     CREATE TABLE IF NOT EXISTS metadata (
         key TEXT PRIMARY KEY NOT NULL,
         value TEXT NOT NULL
-    )
+    ) WITHOUT ROWID
     """,
     """
     CREATE TABLE IF NOT EXISTS reflog (
@@ -96,25 +121,56 @@ CREATE_TABLES = [
 ]
 
 
+# Pre-joined scripts so each connection setup is one executescript() call
+_PRAGMA_SCRIPT = "".join(f"{pragma};\n" for pragma in PRAGMAS)
+_INIT_PRAGMA_SCRIPT = f"PRAGMA page_size={PAGE_SIZE};\n{_PRAGMA_SCRIPT}"
+# Opens the schema transaction and leaves it open for the metadata rows
+_SCHEMA_SCRIPT = "BEGIN;\n" + "".join(f"{stmt.strip()};\n" for stmt in CREATE_TABLES)
+
+_INSERT_METADATA_SQL = "INSERT OR IGNORE INTO metadata (key, value) VALUES (?, ?)"
+_DEFAULT_METADATA = (
+    ("schema_version", SCHEMA_VERSION),
+    ("compression", "none"),
+)
+
+
 def init_db(conn: sqlite3.Connection) -> None:
     """Initialize the database schema."""
-    for pragma in PRAGMAS:
-        conn.execute(pragma)
-    for stmt in CREATE_TABLES:
-        conn.execute(stmt)
-    conn.execute(
-        "INSERT OR IGNORE INTO metadata (key, value) VALUES (?, ?)",
-        ("schema_version", SCHEMA_VERSION),
-    )
-    conn.execute(
-        "INSERT OR IGNORE INTO metadata (key, value) VALUES (?, ?)",
-        ("compression", "none"),
-    )
-    conn.commit()
+    # PRAGMAs (journal_mode in particular) cannot run inside a transaction
+    conn.executescript(_INIT_PRAGMA_SCRIPT)
+    # Build the whole schema in one transaction: a single commit/fsync
+    # instead of one per DDL statement.
+    try:
+        conn.executescript(_SCHEMA_SCRIPT)
+        conn.executemany(_INSERT_METADATA_SQL, _DEFAULT_METADATA)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
 
 
 def apply_pragmas(conn: sqlite3.Connection) -> None:
     """Apply PRAGMAs to an existing connection."""
-    for pragma in PRAGMAS:
-        conn.execute(pragma)
+    conn.executescript(_PRAGMA_SCRIPT)
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """Open a connection to a dulwich-sqlite database file.
+
+    Uses a statement cache of ``CACHED_STATEMENTS`` entries (this can only
+    be set at connect time).  ``isolation_level`` is left at the sqlite3
+    default: the object store and refs rely on implicit BEGIN before DML
+    together with ``with conn:`` and explicit ``BEGIN IMMEDIATE`` blocks.
+    """
+    return sqlite3.connect(db_path, cached_statements=CACHED_STATEMENTS)
+
 
+def optimize_db(conn: sqlite3.Connection) -> None:
+    """Refresh planner statistics where SQLite considers them stale.
+
+    Cheap and idempotent; SQLite recommends running it before closing a
+    connection and after bulk rewrites.  ``analysis_limit`` bounds the
+    rows ANALYZE samples per index.
+    """
+    conn.execute("PRAGMA analysis_limit=400")
+    conn.execute("PRAGMA optimize")
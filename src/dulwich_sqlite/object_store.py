@@ -1,36 +1,94 @@
 """SQLite-backed object store for Dulwich."""
 
+import binascii
+import io
+import json
+import os
 import sqlite3
 import zlib
 from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
 from typing import BinaryIO, cast
 
 from dulwich.object_store import PackCapableObjectStore
 from dulwich.objects import ObjectID, RawObjectID, ShaFile, sha_to_hex
 from dulwich.pack import (
+    DeltaChainIterator,
     Pack,
     PackData,
-    PackInflater,
     PackStreamCopier,
     UnpackedObject,
     write_pack_data,
 )
 
-from ._chunking import chunk_blob
+from ._chunking import chunk_blob, thread_pool
+from ._schema import apply_pragmas
 
 PACK_SPOOL_FILE_MAX_SIZE = 200 * 1024 * 1024
 _BLOB_TYPE_NUM = 3
 _TYPE_TO_DICT_KEY = {1: 'commit', 2: 'tree'}
+# Hot-path SQL lives in module constants so each statement is written once
+# and every call site hits the same entry in the connection's statement cache.
+_CONTAINS_SQL = "SELECT 1 FROM objects WHERE sha = ?"
+_SELECT_SIZE_SQL = "SELECT total_size FROM objects WHERE sha = ?"
+_SELECT_OBJECT_SQL = (
+    "SELECT type_num, data, compression, chunk_refs FROM objects WHERE sha = ?"
+)
+# Uncompressed inline data is not selected: range reads use blobopen.
+_SELECT_OBJECT_RANGE_SQL = (
+    "SELECT type_num, rowid, compression, chunk_refs, total_size, "
+    "CASE WHEN compression = 'none' THEN NULL ELSE data END "
+    "FROM objects WHERE sha = ?"
+)
+# Uncompressed chunk data is not selected: the reader streams it with blobopen.
+# (CASE rather than iif(), which needs SQLite 3.32)
+_SELECT_CHUNK_SQL = (
+    "SELECT compression, "
+    "CASE WHEN compression = 'none' THEN NULL ELSE data END "
+    "FROM chunks WHERE rowid = ?"
+)
+# Chunk lookups take the ordered rowid list as one JSON array parameter, so
+# a single cached statement serves objects of any chunk count and rows come
+# back in chunk_refs order (repeated rowids included).
+_SELECT_CHUNKS_SQL = (
+    "SELECT c.data, c.compression FROM json_each(?) AS j "
+    "JOIN chunks AS c ON c.rowid = j.value ORDER BY j.key"
+)
+_SELECT_CHUNK_SIZES_SQL = (
+    "SELECT c.raw_size FROM json_each(?) AS j "
+    "JOIN chunks AS c ON c.rowid = j.value ORDER BY j.key"
+)
+# Objects with at least this many chunks (~1 MiB at the binary average)
+# decompress them on the shared thread pool; zlib and zstd release the GIL.
+PARALLEL_DECOMPRESS_MIN_CHUNKS = 128
+# Blobs adding at least this many new chunks (~256 KiB) compress them on
+# the shared thread pool, like PARALLEL_DECOMPRESS_MIN_CHUNKS for reads.
+PARALLEL_COMPRESS_MIN_CHUNKS = 32
+# Inline payloads at least this large are zstd-compressed by libzstd worker
+# threads, without a dictionary (it buys nothing at this size).
+PARALLEL_COMPRESS_THRESHOLD = 256 * 1024
+_CHUNK_LOOKUP_BATCH = 64
+_SELECT_CHUNK_ROWIDS_SQL = (
+    "SELECT chunk_sha, rowid FROM chunks WHERE chunk_sha IN ("
+    + ",".join("?" * _CHUNK_LOOKUP_BATCH)
+    + ")"
+)
+_INSERT_CHUNK_SQL = (
+    "INSERT OR IGNORE INTO chunks (chunk_sha, data, compression, raw_size) "
+    "VALUES (?, ?, ?, ?)"
+)
+_INSERT_OBJECT_SQL = (
+    "INSERT OR REPLACE INTO objects (sha, type_num, data, chunk_refs, total_size, compression) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
 
 
-def _encode_unsigned_varint(value: int) -> bytes:
-    """Encode unsigned int as LEB128 varint."""
-    parts = []
+def _append_unsigned_varint(buf: bytearray, value: int) -> None:
+    """Append unsigned int to buf as LEB128 varint."""
     while value > 0x7F:
-        parts.append((value & 0x7F) | 0x80)
+        buf.append((value & 0x7F) | 0x80)
         value >>= 7
-    parts.append(value & 0x7F)
-    return bytes(parts)
+    buf.append(value)
 
 
 def _decode_unsigned_varint(data: bytes, offset: int) -> tuple[int, int]:
@@ -50,38 +108,120 @@ def pack_chunk_refs(rowids: list[int]) -> bytes:
     """Pack ordered chunk rowids as delta-zigzag-varint blob."""
     if not rowids:
         return b""
-    parts = [_encode_unsigned_varint(rowids[0])]
+    buf = bytearray()
+    _append_unsigned_varint(buf, rowids[0])
     prev = rowids[0]
     for rid in rowids[1:]:
         delta = rid - prev
         zigzag = (delta << 1) ^ (delta >> 63)
-        parts.append(_encode_unsigned_varint(zigzag))
+        if zigzag < 0x80:  # single-byte varint: the common delta=+1 case
+            buf.append(zigzag)
+        else:
+            _append_unsigned_varint(buf, zigzag)
         prev = rid
-    return b"".join(parts)
+    return bytes(buf)
 
 
 def unpack_chunk_refs(data: bytes) -> list[int]:
     """Unpack delta-zigzag-varint blob into ordered chunk rowids."""
     if not data:
         return []
-    offset = 0
-    first, offset = _decode_unsigned_varint(data, offset)
-    rowids = [first]
-    prev = first
-    while offset < len(data):
-        zigzag, offset = _decode_unsigned_varint(data, offset)
-        delta = (zigzag >> 1) ^ -(zigzag & 1)
-        prev += delta
+    prev, offset = _decode_unsigned_varint(data, 0)
+    rowids = [prev]
+    size = len(data)
+    while offset < size:
+        zigzag = data[offset]
+        if zigzag < 0x80:
+            offset += 1
+        else:
+            zigzag, offset = _decode_unsigned_varint(data, offset)
+        prev += (zigzag >> 1) ^ -(zigzag & 1)
         rowids.append(prev)
     return rowids
 
 
+class _ChunkedObjectReader(io.RawIOBase):
+    """Read-only stream over a chunked object, fetching chunks lazily.
+
+    Uncompressed chunks are read through SQLite incremental BLOB I/O, so
+    only the requested bytes are copied into Python; compressed chunks
+    are decompressed one at a time as the stream reaches them.
+    """
+
+    def __init__(self, store: "SqliteObjectStore", rowids: list[int]) -> None:
+        super().__init__()
+        self._store = store
+        self._rowids = iter(rowids)
+        self._current: sqlite3.Blob | io.BytesIO | None = None
+
+    def readable(self) -> bool:
+        return True
+
+    def _next_chunk(self) -> bool:
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        rowid = next(self._rowids, None)
+        if rowid is None:
+            return False
+        conn = self._store._conn
+        row = conn.execute(_SELECT_CHUNK_SQL, (rowid,)).fetchone()
+        if row is None:
+            raise KeyError(f"missing chunk row {rowid}")
+        compression, data = row
+        if compression == "none":
+            self._current = conn.blobopen("chunks", "data", rowid, readonly=True)
+        else:
+            self._current = io.BytesIO(self._store._decompress(data, compression))
+        return True
+
+    def readinto(self, buffer) -> int:
+        want = len(buffer)
+        while want:
+            if self._current is not None:
+                data = self._current.read(want)
+                if data:
+                    buffer[: len(data)] = data
+                    return len(data)
+            if not self._next_chunk():
+                break
+        return 0
+
+    def close(self) -> None:
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        super().close()
+
+
+class _RawObjectInflater(DeltaChainIterator[tuple[bytes, int, bytes]]):
+    """Resolve a pack's delta chains into ``(binary sha, type_num, raw data)``.
+
+    Unlike ``PackInflater`` this does not parse each object into a
+    ``ShaFile``: the store only needs the raw bytes, and parsing every tree
+    and commit of an incoming pack is the dominant Python cost of ingestion.
+    """
+
+    def _result(self, unpacked: UnpackedObject) -> tuple[bytes, int, bytes]:
+        assert unpacked.obj_type_num is not None and unpacked.obj_chunks is not None
+        return unpacked.sha(), unpacked.obj_type_num, b"".join(unpacked.obj_chunks)
+
+
 class SqliteObjectStore(PackCapableObjectStore):
     """Object store backed by a SQLite database."""
 
-    def __init__(self, conn: sqlite3.Connection) -> None:
+    def __init__(self, conn: sqlite3.Connection, tune: bool = False) -> None:
+        """Wrap an initialized database connection.
+
+        With ``tune=True`` the repository PRAGMAs (WAL, ``synchronous=NORMAL``,
+        cache and mmap sizes) are applied to ``conn``; ``SqliteRepo`` already
+        does this when it opens the database.
+        """
         super().__init__()
         self._conn = conn
+        self._batch_depth = 0
+        if tune:
+            apply_pragmas(conn)
         self.pack_compression_level = -1
         row = conn.execute(
             "SELECT value FROM metadata WHERE key = 'compression'"
@@ -89,6 +229,11 @@ class SqliteObjectStore(PackCapableObjectStore):
         self._compression: str = row[0] if row is not None else "none"
         self._zstd_dicts: dict[str, "zstandard.ZstdCompressionDict"] = {}
         self._zstd_dicts_by_id: dict[int, "zstandard.ZstdCompressionDict"] = {}
+        # Reused compression contexts, keyed by dict key (None = no dict)
+        self._zstd_compressors: dict[str | None, "zstandard.ZstdCompressor"] = {}
+        self._zstd_mt_compressor: "zstandard.ZstdCompressor | None" = None
+        # Reused decompression contexts, keyed by frame dict_id (0 = no dict)
+        self._zstd_decompressors: dict[int, "zstandard.ZstdDecompressor"] = {}
         for key, path in [('commit', '_zstd_dict_commit'), ('tree', '_zstd_dict_tree'),
                           ('chunk', '_zstd_dict_chunk'), ('legacy', '_zstd_dict')]:
             dict_row = conn.execute(
@@ -97,7 +242,7 @@ class SqliteObjectStore(PackCapableObjectStore):
             if dict_row is not None:
                 import zstandard
 
-                d = zstandard.ZstdCompressionDict(bytes(dict_row[0]))
+                d = zstandard.ZstdCompressionDict(dict_row[0])
                 d.precompute_compress(level=3)
                 self._zstd_dicts[key] = d
                 self._zstd_dicts_by_id[d.dict_id()] = d
@@ -112,12 +257,24 @@ class SqliteObjectStore(PackCapableObjectStore):
 
     def _to_dbsha(self, sha: ObjectID | RawObjectID) -> bytes:
         """Convert Dulwich ObjectID/RawObjectID to 20-byte binary for DB lookup."""
-        if len(sha) == self.object_format.oid_length:  # 20 bytes raw
-            return bytes(sha)
-        hexsha = self._to_hexsha(sha)
-        return bytes.fromhex(hexsha.decode("ascii"))
-
-    def _compress(self, data: bytes, dict_key: str | None = None) -> bytes:
+        size = len(sha)
+        if size == self.object_format.oid_length:  # 20 bytes raw
+            return sha
+        if size == self.object_format.hex_length:
+            return binascii.unhexlify(sha)
+        raise ValueError(f"Invalid sha {sha!r}")
+
+    def _compress(
+        self,
+        data: bytes,
+        dict_key: str | None = None,
+        zstd_contexts: dict[str | None, "zstandard.ZstdCompressor"] | None = None,
+    ) -> bytes:
+        """Compress data with the store's method.
+
+        As in ``_decompress``, worker threads pass a private
+        ``zstd_contexts`` dict because contexts are not thread-safe.
+        """
         if self._compression == "none":
             return data
         if self._compression == "zlib":
@@ -125,15 +282,44 @@ class SqliteObjectStore(PackCapableObjectStore):
         if self._compression == "zstd":
             import zstandard
 
-            kwargs = {}
             zdict = self._zstd_dicts.get(dict_key) if dict_key else None
-            if zdict is not None:
-                kwargs["dict_data"] = zdict
-            cctx = zstandard.ZstdCompressor(level=3, **kwargs)
+            # The multi-threaded context has no dictionary, so it only takes
+            # data without one.  Callers with private contexts are already
+            # running in parallel (and must not share it).
+            if (
+                zdict is None
+                and zstd_contexts is None
+                and len(data) >= PARALLEL_COMPRESS_THRESHOLD
+                and (os.cpu_count() or 1) > 1
+            ):
+                if self._zstd_mt_compressor is None:
+                    self._zstd_mt_compressor = zstandard.ZstdCompressor(level=3, threads=-1)
+                return self._zstd_mt_compressor.compress(data)
+            cache_key = dict_key if zdict is not None else None
+            if zstd_contexts is None:
+                zstd_contexts = self._zstd_compressors
+            cctx = zstd_contexts.get(cache_key)
+            if cctx is None:
+                kwargs = {}
+                if zdict is not None:
+                    kwargs["dict_data"] = zdict
+                cctx = zstandard.ZstdCompressor(level=3, **kwargs)
+                zstd_contexts[cache_key] = cctx
             return cctx.compress(data)
         raise ValueError(f"Unknown compression method: {self._compression}")
 
-    def _decompress(self, data: bytes, method: str) -> bytes:
+    def _decompress(
+        self,
+        data: bytes,
+        method: str,
+        zstd_contexts: dict[int, "zstandard.ZstdDecompressor"] | None = None,
+    ) -> bytes:
+        """Decompress stored data.
+
+        zstd contexts are reused from ``zstd_contexts`` (default: the store's
+        own cache).  Contexts are not thread-safe, so worker threads pass a
+        private dict.
+        """
         if method == "none":
             return data
         if method == "zlib":
@@ -141,30 +327,38 @@ class SqliteObjectStore(PackCapableObjectStore):
         if method == "zstd":
             import zstandard
 
-            params = zstandard.get_frame_parameters(data)
-            dict_data = self._zstd_dicts_by_id.get(params.dict_id)
-            if dict_data is not None:
-                dctx = zstandard.ZstdDecompressor(dict_data=dict_data)
-            else:
-                dctx = zstandard.ZstdDecompressor()
+            if zstd_contexts is None:
+                zstd_contexts = self._zstd_decompressors
+            dict_id = zstandard.get_frame_parameters(data).dict_id
+            dctx = zstd_contexts.get(dict_id)
+            if dctx is None:
+                dict_data = self._zstd_dicts_by_id.get(dict_id)
+                if dict_data is not None:
+                    dctx = zstandard.ZstdDecompressor(dict_data=dict_data)
+                else:
+                    dctx = zstandard.ZstdDecompressor()
+                if dict_data is not None or dict_id == 0:
+                    zstd_contexts[dict_id] = dctx
             return dctx.decompress(data)
         raise ValueError(f"Unknown compression method: {method}")
 
     def contains_loose(self, sha: ObjectID | RawObjectID) -> bool:
         dbsha = self._to_dbsha(sha)
-        row = self._conn.execute(
-            "SELECT 1 FROM objects WHERE sha = ?",
-            (dbsha,),
-        ).fetchone()
+        row = self._conn.execute(_CONTAINS_SQL, (dbsha,)).fetchone()
         return row is not None
 
     def contains_packed(self, sha: ObjectID | RawObjectID) -> bool:
         return False
 
     def __iter__(self) -> Iterator[ObjectID]:
+        """Yield the hex SHA of every stored object.
+
+        The ids are read up front, so callers may add objects while
+        iterating and still see a stable snapshot.
+        """
         rows = self._conn.execute("SELECT sha FROM objects").fetchall()
         for (sha_bytes,) in rows:
-            yield bytes(sha_bytes).hex().encode("ascii")
+            yield sha_to_hex(sha_bytes)
 
     @property
     def packs(self) -> list[Pack]:
@@ -172,36 +366,52 @@ class SqliteObjectStore(PackCapableObjectStore):
 
     def get_object_size(self, sha: ObjectID | RawObjectID) -> int:
         dbsha = self._to_dbsha(sha)
-        row = self._conn.execute(
-            "SELECT size_bytes FROM objects WHERE sha = ?",
-            (dbsha,),
-        ).fetchone()
+        row = self._conn.execute(_SELECT_SIZE_SQL, (dbsha,)).fetchone()
         if row is None:
             raise KeyError(self._to_hexsha(sha))
         return row[0]
 
     def get_raw(self, name: RawObjectID | ObjectID) -> tuple[int, bytes]:
         dbsha = self._to_dbsha(name)
-        row = self._conn.execute(
-            "SELECT type_num, data, compression, chunk_refs FROM objects WHERE sha = ?",
-            (dbsha,),
-        ).fetchone()
+        row = self._conn.execute(_SELECT_OBJECT_SQL, (dbsha,)).fetchone()
         if row is None:
             raise KeyError(self._to_hexsha(name))
         type_num, data, compression, chunk_refs = row
         if data is not None:
-            return type_num, self._decompress(bytes(data), compression)
+            return type_num, self._decompress(data, compression)
         # Reassemble from chunks using delta-varint packed rowids
-        rowids = unpack_chunk_refs(bytes(chunk_refs))
-        n = len(rowids)
-        placeholders = ','.join('?' * n)
-        chunk_rows = self._conn.execute(
-            f"SELECT rowid, data, compression FROM chunks WHERE rowid IN ({placeholders})",
-            rowids,
-        ).fetchall()
-        by_rowid = {r[0]: (r[1], r[2]) for r in chunk_rows}
-        parts = [self._decompress(bytes(by_rowid[rid][0]), by_rowid[rid][1]) for rid in rowids]
-        return type_num, b"".join(parts)
+        rowids = unpack_chunk_refs(chunk_refs)
+        return type_num, b"".join(self._read_chunks(rowids))
+
+    def _read_chunks(self, rowids: list[int]) -> list[bytes]:
+        """Return the decompressed data of the given chunks, in order."""
+        rows = self._conn.execute(_SELECT_CHUNKS_SQL, (json.dumps(rowids),)).fetchall()
+        if len(rows) != len(rowids):
+            # The join silently drops rowids without a chunks row
+            raise KeyError("missing chunk rows for object")
+        workers = os.cpu_count() or 1
+        if (
+            len(rows) < PARALLEL_DECOMPRESS_MIN_CHUNKS
+            or workers == 1
+            # Decide from the rows: compression may have been toggled since
+            # they were written
+            or all(compression == "none" for _, compression in rows)
+        ):
+            decompress = self._decompress
+            return [decompress(data, compression) for data, compression in rows]
+        # One contiguous slice per worker keeps the hand-off count low
+        step = -(-len(rows) // workers)
+        slices = [rows[i : i + step] for i in range(0, len(rows), step)]
+        return [
+            part
+            for parts in thread_pool().map(self._decompress_rows, slices)
+            for part in parts
+        ]
+
+    def _decompress_rows(self, rows: list[tuple[bytes, str]]) -> list[bytes]:
+        """Decompress ``(data, compression)`` rows with thread-private zstd contexts."""
+        contexts: dict[int, "zstandard.ZstdDecompressor"] = {}
+        return [self._decompress(data, method, contexts) for data, method in rows]
 
     def get_raw_range(
         self,
@@ -212,7 +422,8 @@ class SqliteObjectStore(PackCapableObjectStore):
         """Return a byte range of an object's raw data.
 
         For chunked objects, only the chunks overlapping the requested range
-        are fetched and decompressed.  For inline objects the full data is
+        are fetched and decompressed.  Uncompressed inline objects are read
+        in place with incremental BLOB I/O; compressed inline objects are
         decompressed and sliced (they are small by definition).
 
         Args:
@@ -229,37 +440,38 @@ class SqliteObjectStore(PackCapableObjectStore):
             KeyError: If the object does not exist.
         """
         dbsha = self._to_dbsha(name)
-        row = self._conn.execute(
-            "SELECT type_num, data, compression, chunk_refs, total_size FROM objects WHERE sha = ?",
-            (dbsha,),
-        ).fetchone()
+        row = self._conn.execute(_SELECT_OBJECT_RANGE_SQL, (dbsha,)).fetchone()
         if row is None:
             raise KeyError(self._to_hexsha(name))
-        type_num, data, compression, chunk_refs, total_size = row
-
-        # Inline object — decompress full data and slice
-        if data is not None:
-            raw = self._decompress(bytes(data), compression)
+        type_num, rowid, compression, chunk_refs, total_size, data = row
+
+        if chunk_refs is None:
+            if data is None:
+                # Uncompressed inline object — read just the range
+                with self._conn.blobopen("objects", "data", rowid, readonly=True) as blob:
+                    if offset < 0 or length < 0:
+                        return type_num, blob.read()[offset : offset + length]
+                    blob.seek(min(offset, total_size))
+                    return type_num, blob.read(length)
+            # Compressed inline object — decompress full data and slice
+            raw = self._decompress(data, compression)
             return type_num, raw[offset : offset + length]
 
         # Chunked object — use raw_size to identify overlapping chunks
-        rowids = unpack_chunk_refs(bytes(chunk_refs))
+        rowids = unpack_chunk_refs(chunk_refs)
         n = len(rowids)
         if n == 0 or offset >= (total_size or 0):
             return type_num, b""
 
-        # Fetch raw_size for each chunk
-        placeholders = ",".join("?" * n)
-        size_rows = self._conn.execute(
-            f"SELECT rowid, raw_size FROM chunks WHERE rowid IN ({placeholders})",
-            rowids,
-        ).fetchall()
-        size_by_rowid = {r[0]: r[1] for r in size_rows}
-
-        # Build cumulative offset array
+        # Build cumulative offset array from each chunk's raw_size
         cumulative = [0]
-        for rid in rowids:
-            cumulative.append(cumulative[-1] + size_by_rowid[rid])
+        for (raw_size,) in self._conn.execute(
+            _SELECT_CHUNK_SIZES_SQL, (json.dumps(rowids),)
+        ):
+            cumulative.append(cumulative[-1] + raw_size)
+        if len(cumulative) != n + 1:
+            # The join silently drops rowids without a chunks row
+            raise KeyError("missing chunk rows for object")
 
         # Find overlapping chunks
         end = min(offset + length, cumulative[-1])
@@ -279,74 +491,218 @@ class SqliteObjectStore(PackCapableObjectStore):
                 break
 
         # Fetch and decompress only the overlapping chunks
-        needed_rowids = rowids[first_chunk : last_chunk + 1]
-        needed_placeholders = ",".join("?" * len(needed_rowids))
-        chunk_rows = self._conn.execute(
-            f"SELECT rowid, data, compression FROM chunks WHERE rowid IN ({needed_placeholders})",
-            needed_rowids,
-        ).fetchall()
-        by_rowid = {r[0]: (r[1], r[2]) for r in chunk_rows}
-
-        parts = []
-        for rid in needed_rowids:
-            parts.append(self._decompress(bytes(by_rowid[rid][0]), by_rowid[rid][1]))
-        assembled = b"".join(parts)
+        assembled = b"".join(self._read_chunks(rowids[first_chunk : last_chunk + 1]))
 
         # Slice relative to first chunk's start
         slice_start = offset - cumulative[first_chunk]
         slice_end = slice_start + (end - offset)
         return type_num, assembled[slice_start:slice_end]
 
-    def _insert_object(self, obj: ShaFile) -> None:
-        """Insert a single object without committing the transaction."""
-        sha_bin = bytes.fromhex(obj.id.decode("ascii"))
-        raw_data = obj.as_raw_string()
+    def open_raw(self, name: RawObjectID | ObjectID) -> tuple[int, BinaryIO]:
+        """Open an object's raw data as a read-only binary stream.
+
+        For chunked objects, chunks are fetched only as the stream reaches
+        them, so reading a prefix (e.g. a header) never loads the rest of
+        the blob.  Inline objects are decompressed up front and wrapped in
+        a ``BytesIO`` (they are small by definition).
+
+        Args:
+            name: Object SHA (hex or binary).
 
+        Returns:
+            ``(type_num, stream)``.  Close the stream when done.
+
+        Raises:
+            KeyError: If the object does not exist.
+        """
+        dbsha = self._to_dbsha(name)
+        row = self._conn.execute(_SELECT_OBJECT_SQL, (dbsha,)).fetchone()
+        if row is None:
+            raise KeyError(self._to_hexsha(name))
+        type_num, data, compression, chunk_refs = row
+        if data is not None:
+            return type_num, io.BytesIO(self._decompress(data, compression))
+        reader = _ChunkedObjectReader(self, unpack_chunk_refs(chunk_refs))
+        return type_num, cast(BinaryIO, io.BufferedReader(reader))
+
+    def _chunk_row(
+        self,
+        chunk_sha: bytes,
+        chunk_data: bytes,
+        zstd_contexts: dict[str | None, "zstandard.ZstdCompressor"] | None = None,
+    ) -> tuple:
+        """Return the ``chunks`` row for a chunk, compressing it if enabled."""
+        stored_data = self._compress(chunk_data, dict_key='chunk', zstd_contexts=zstd_contexts)
+        method = self._compression
+        if method != "none" and len(stored_data) >= len(chunk_data):
+            # Incompressible (e.g. already-compressed media): keep
+            # the raw bytes so reads skip a pointless decompress.
+            stored_data, method = chunk_data, "none"
+        return (chunk_sha, stored_data, method, len(chunk_data))
+
+    def _chunk_rowids(self, chunk_shas: list[bytes]) -> dict[bytes, int]:
+        """Map chunk SHA-256 digests to their rowids.
+
+        Looks up ``_CHUNK_LOOKUP_BATCH`` digests per query, padding the last
+        batch with a repeated digest so every lookup shares one statement.
+        """
+        found: dict[bytes, int] = {}
+        for i in range(0, len(chunk_shas), _CHUNK_LOOKUP_BATCH):
+            batch = chunk_shas[i : i + _CHUNK_LOOKUP_BATCH]
+            batch += [batch[0]] * (_CHUNK_LOOKUP_BATCH - len(batch))
+            found.update(self._conn.execute(_SELECT_CHUNK_ROWIDS_SQL, batch))
+        return found
+
+    def _chunk_rows(self, chunks: list[tuple[bytes, bytes]]) -> list[tuple]:
+        """Return ``chunks`` rows for new chunks, compressing large batches in parallel."""
+        workers = os.cpu_count() or 1
+        if (
+            len(chunks) < PARALLEL_COMPRESS_MIN_CHUNKS
+            or workers == 1
+            or self._compression == "none"
+        ):
+            return [self._chunk_row(sha, data) for sha, data in chunks]
+        step = -(-len(chunks) // workers)
+        slices = [chunks[i : i + step] for i in range(0, len(chunks), step)]
+        return [
+            row
+            for rows in thread_pool().map(self._compress_chunks, slices)
+            for row in rows
+        ]
+
+    def _compress_chunks(self, chunks: list[tuple[bytes, bytes]]) -> list[tuple]:
+        """Build ``chunks`` rows with thread-private zstd contexts."""
+        contexts: dict[str | None, "zstandard.ZstdCompressor"] = {}
+        return [self._chunk_row(sha, data, contexts) for sha, data in chunks]
+
+    def _recompress_rows(self, rows: list[tuple[bytes, str, str | None]]) -> list[bytes]:
+        """Re-encode ``(data, compression, dict_key)`` rows with the current settings.
+
+        Large batches are split across the shared thread pool like
+        ``_chunk_rows``; small ones run here with the store's cached
+        contexts, so they are reused from one batch to the next.
+        """
+        workers = os.cpu_count() or 1
+        if len(rows) < PARALLEL_COMPRESS_MIN_CHUNKS or workers == 1:
+            return [
+                self._compress(self._decompress(data, method), dict_key)
+                for data, method, dict_key in rows
+            ]
+        step = -(-len(rows) // workers)
+        slices = [rows[i : i + step] for i in range(0, len(rows), step)]
+        return [
+            data
+            for out in thread_pool().map(self._recompress_slice, slices)
+            for data in out
+        ]
+
+    def _recompress_slice(self, rows: list[tuple[bytes, str, str | None]]) -> list[bytes]:
+        """Re-encode rows with thread-private zstd contexts."""
+        dctxs: dict[int, "zstandard.ZstdDecompressor"] = {}
+        cctxs: dict[str | None, "zstandard.ZstdCompressor"] = {}
+        return [
+            self._compress(self._decompress(data, method, dctxs), dict_key, cctxs)
+            for data, method, dict_key in rows
+        ]
+
+    def _store_chunks(self, chunks: dict[bytes, bytes]) -> dict[bytes, int]:
+        """Store any chunks not already present and map every digest to its rowid.
+
+        Existing chunks are found with one batched lookup; each new chunk's
+        rowid comes from ``lastrowid`` rather than a second SELECT. A chunk
+        inserted concurrently by another connection (``rowcount == 0``)
+        falls back to a lookup.
+        """
+        rowid_by_sha = self._chunk_rowids(list(chunks))
+        missing = [item for item in chunks.items() if item[0] not in rowid_by_sha]
+        for row in self._chunk_rows(missing):
+            chunk_sha = row[0]
+            cur = self._conn.execute(_INSERT_CHUNK_SQL, row)
+            if cur.rowcount == 1:
+                rowid_by_sha[chunk_sha] = cur.lastrowid
+            else:
+                rowid_by_sha.update(self._chunk_rowids([chunk_sha]))
+        return rowid_by_sha
+
+    def _object_row(self, obj: ShaFile) -> tuple:
+        """Store an object's chunks (if any) and return its ``objects`` row.
+
+        The returned tuple matches the parameters of ``_INSERT_OBJECT_SQL``.
+        Does not commit the transaction.
+        """
+        return self._raw_object_row(
+            binascii.unhexlify(obj.id), obj.type_num, obj.as_raw_string()
+        )
+
+    def _raw_object_row(self, sha_bin: bytes, type_num: int, raw_data: bytes) -> tuple:
+        """Like ``_object_row`` for an object given as its binary SHA and raw bytes."""
         chunks = None
-        if obj.type_num == _BLOB_TYPE_NUM:
+        if type_num == _BLOB_TYPE_NUM:
             chunks = chunk_blob(raw_data)
 
         if chunks is not None:
-            chunk_rowids = []
-            for chunk_sha_bin, chunk_data in chunks:
-                stored_data = self._compress(chunk_data, dict_key='chunk')
-                self._conn.execute(
-                    "INSERT OR IGNORE INTO chunks (chunk_sha, data, compression, raw_size) "
-                    "VALUES (?, ?, ?, ?)",
-                    (chunk_sha_bin, stored_data, self._compression, len(chunk_data)),
-                )
-                chunk_rowid = self._conn.execute(
-                    "SELECT rowid FROM chunks WHERE chunk_sha = ?",
-                    (chunk_sha_bin,),
-                ).fetchone()[0]
-                chunk_rowids.append(chunk_rowid)
-            packed = pack_chunk_refs(chunk_rowids)
-            self._conn.execute(
-                "INSERT OR REPLACE INTO objects (sha, type_num, data, chunk_refs, total_size, compression) "
-                "VALUES (?, ?, NULL, ?, ?, 'none')",
-                (sha_bin, obj.type_num, packed, len(raw_data)),
-            )
+            # Repeated content within one blob (e.g. duplicated paragraphs)
+            # is compressed and inserted only once.
+            rowid_by_sha = self._store_chunks(dict(chunks))
+            packed = pack_chunk_refs([rowid_by_sha[sha] for sha, _ in chunks])
+            return (sha_bin, type_num, None, packed, len(raw_data), "none")
+        # Inline storage
+        stored_data = self._compress(raw_data, dict_key=_TYPE_TO_DICT_KEY.get(type_num))
+        return (sha_bin, type_num, stored_data, None, len(raw_data), self._compression)
+
+    def _insert_object(self, obj: ShaFile) -> None:
+        """Insert a single object without committing the transaction."""
+        self._conn.execute(_INSERT_OBJECT_SQL, self._object_row(obj))
+
+    def _insert_objects(self, objects: Iterable[ShaFile]) -> None:
+        """Insert many objects with one prepared statement, without committing."""
+        self._conn.executemany(
+            _INSERT_OBJECT_SQL, (self._object_row(obj) for obj in objects)
+        )
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Group writes into one transaction.
+
+        ``add_object``, ``add_objects`` and pack commits inside the block do
+        not commit on their own; everything is committed when the outermost
+        ``batch()`` exits, or rolled back if it raises.
+        """
+        if self._batch_depth:
+            self._batch_depth += 1
+            try:
+                yield
+            finally:
+                self._batch_depth -= 1
+            return
+        self._batch_depth = 1
+        try:
+            with self._conn:
+                yield
+        finally:
+            self._batch_depth = 0
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """Commit on success unless inside ``batch()``, which commits later."""
+        if self._batch_depth:
+            yield
         else:
-            # Inline storage
-            stored_data = self._compress(raw_data, dict_key=_TYPE_TO_DICT_KEY.get(obj.type_num))
-            self._conn.execute(
-                "INSERT OR REPLACE INTO objects (sha, type_num, data, chunk_refs, total_size, compression) "
-                "VALUES (?, ?, ?, NULL, ?, ?)",
-                (sha_bin, obj.type_num, stored_data, len(raw_data), self._compression),
-            )
+            with self._conn:
+                yield
 
     def add_object(self, obj: ShaFile) -> None:
         self._insert_object(obj)
-        self._conn.commit()
+        if not self._batch_depth:
+            self._conn.commit()
 
     def add_objects(
         self,
         objects: Iterable[tuple[ShaFile, str | None]],
         progress: Callable[[str], None] | None = None,
     ) -> None:
-        with self._conn:
-            for obj, path in objects:
-                self._insert_object(obj)
+        with self._transaction():
+            self._insert_objects(obj for obj, path in objects)
 
     def add_pack(self) -> tuple[BinaryIO, Callable[[], None], Callable[[], None]]:
         from tempfile import SpooledTemporaryFile
@@ -358,9 +714,14 @@ class SqliteObjectStore(PackCapableObjectStore):
             if size > 0:
                 f.seek(0)
                 p = PackData.from_file(f, self.object_format, size)
-                with self._conn:
-                    for obj in PackInflater.for_pack_data(p, self.get_raw):
-                        self._insert_object(obj)
+                with self._transaction():
+                    self._conn.executemany(
+                        _INSERT_OBJECT_SQL,
+                        (
+                            self._raw_object_row(*obj)
+                            for obj in _RawObjectInflater.for_pack_data(p, self.get_raw)
+                        ),
+                    )
                 p.close()
                 f.close()
             else:
@@ -415,11 +776,6 @@ class SqliteObjectStore(PackCapableObjectStore):
         else:
             commit()
 
-    @staticmethod
-    def _escape_like(s: str) -> str:
-        """Escape ``%``, ``_``, and ``\\`` for use in a LIKE pattern."""
-        return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
-
     def search_content(
         self,
         query: str,
@@ -428,59 +784,64 @@ class SqliteObjectStore(PackCapableObjectStore):
     ) -> list[ObjectID]:
         """Search blob content for matching objects via literal substring match.
 
+        Matching is ASCII case-insensitive (as SQL ``LIKE`` was) and
+        otherwise byte-exact, in SQL and in the Python-side passes alike.
+
         Args:
             query: Substring to search for in blob content.
             limit: Maximum number of results to return.
         """
         results: set[bytes] = set()
-        query_bytes = query.encode("utf-8", errors="surrogateescape")
-        escaped = self._escape_like(query)
+        # bytes.lower() and SQLite's lower() both fold ASCII letters only
+        query_bytes = query.encode("utf-8", errors="surrogateescape").lower()
 
-        # 1. SQL LIKE on uncompressed inline blobs (escape LIKE wildcards)
+        # 1. Byte substring match on uncompressed inline blobs.  instr() on
+        # two BLOBs is a plain byte search, with no wildcard escaping.
         for row in self._conn.execute(
             "SELECT sha FROM objects "
             "WHERE data IS NOT NULL AND type_num = 3 AND compression = 'none' "
-            "AND CAST(data AS TEXT) LIKE ? ESCAPE '\\'",
-            (f"%{escaped}%",),
+            "AND instr(CAST(lower(data) AS BLOB), ?) > 0",
+            (query_bytes,),
         ).fetchall():
-            results.add(bytes(row[0]))
+            results.add(row[0])
 
-        # 2. Python-side search on compressed inline blobs
+        # 2. Python-side search on compressed inline blobs.  The compressed
+        # passes iterate their cursors so only one row is held at a time.
         for row in self._conn.execute(
             "SELECT sha, data, compression FROM objects "
             "WHERE data IS NOT NULL AND type_num = 3 AND compression != 'none'"
-        ).fetchall():
-            sha_bin = bytes(row[0])
+        ):
+            sha_bin = row[0]
             if sha_bin not in results:
-                if query_bytes in self._decompress(bytes(row[1]), row[2]):
+                if query_bytes in self._decompress(row[1], row[2]).lower():
                     results.add(sha_bin)
 
         # 3. Find candidate chunk rowids (uncompressed via SQL, compressed via Python)
         candidate_chunk_rowids: set[int] = set()
         for row in self._conn.execute(
             "SELECT rowid FROM chunks "
-            "WHERE compression = 'none' AND CAST(data AS TEXT) LIKE ? ESCAPE '\\'",
-            (f"%{escaped}%",),
+            "WHERE compression = 'none' AND instr(CAST(lower(data) AS BLOB), ?) > 0",
+            (query_bytes,),
         ).fetchall():
             candidate_chunk_rowids.add(row[0])
 
         for row in self._conn.execute(
             "SELECT rowid, data, compression FROM chunks WHERE compression != 'none'"
-        ).fetchall():
-            if query_bytes in self._decompress(bytes(row[1]), row[2]):
+        ):
+            if query_bytes in self._decompress(row[1], row[2]).lower():
                 candidate_chunk_rowids.add(row[0])
 
         # 4. Scan chunked objects: check single-chunk matches and boundary spans
         for row in self._conn.execute(
             "SELECT sha, chunk_refs FROM objects "
             "WHERE chunk_refs IS NOT NULL AND type_num = 3"
-        ).fetchall():
-            sha_bin = bytes(row[0])
+        ):
+            sha_bin = row[0]
             if sha_bin in results:
                 continue
-            rowids = unpack_chunk_refs(bytes(row[1]))
+            rowids = unpack_chunk_refs(row[1])
             # Fast path: any single chunk contains the query
-            if set(rowids) & candidate_chunk_rowids:
+            if not candidate_chunk_rowids.isdisjoint(rowids):
                 results.add(sha_bin)
                 continue
             # Slow path: check chunk boundaries for spans
@@ -488,18 +849,20 @@ class SqliteObjectStore(PackCapableObjectStore):
                 overlap = len(query_bytes) - 1
                 prev_tail = b""
                 found = False
-                for rid in rowids:
-                    chunk_row = self._conn.execute(
-                        "SELECT data, compression FROM chunks WHERE rowid = ?",
-                        (rid,),
-                    ).fetchone()
-                    chunk_data = self._decompress(bytes(chunk_row[0]), chunk_row[1])
+                # One ordered query per object; iterating the cursor lets
+                # a match stop before the remaining chunks are read.
+                for data, compression in self._conn.execute(
+                    _SELECT_CHUNKS_SQL, (json.dumps(rowids),)
+                ):
+                    chunk_data = self._decompress(data, compression).lower()
                     if prev_tail:
                         window = prev_tail + chunk_data[:overlap]
                         if query_bytes in window:
                             found = True
                             break
-                    prev_tail = chunk_data[-overlap:] if len(chunk_data) >= overlap else chunk_data
+                    # Keep the last `overlap` bytes of everything seen so far,
+                    # so matches spanning a chunk shorter than the query work.
+                    prev_tail = (prev_tail + chunk_data[-overlap:])[-overlap:]
                 if found:
                     results.add(sha_bin)
 
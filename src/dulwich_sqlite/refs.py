@@ -1,11 +1,15 @@
 """SQLite-backed refs container for Dulwich."""
 
 import sqlite3
-from collections.abc import Callable
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
 
 from dulwich.objects import ZERO_SHA, ObjectID
 from dulwich.refs import RefsContainer, Ref, SYMREF
 
+# DELETE ... RETURNING needs SQLite 3.35; older libraries read then delete.
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
 
 class SqliteRefsContainer(RefsContainer):
     """Refs container backed by a SQLite database."""
@@ -14,13 +18,46 @@ class SqliteRefsContainer(RefsContainer):
         self,
         conn: sqlite3.Connection,
         logger: Callable | None = None,
+        in_batch: Callable[[], bool] | None = None,
     ) -> None:
         super().__init__(logger=logger)
         self._conn = conn
+        # Reports whether an enclosing batch will commit for us
+        self._in_batch = in_batch or (lambda: False)
+
+    @contextmanager
+    def _write(self) -> Iterator[None]:
+        """Make one ref change and its reflog entry atomic.
+
+        On its own this is a ``BEGIN IMMEDIATE`` transaction that it commits.
+        Inside a batch, or a transaction the caller already has open, it is
+        a savepoint instead: a failed ref change is undone without touching
+        the surrounding writes, and committing is left to their owner.
+        """
+        if not self._conn.in_transaction and not self._in_batch():
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+            return
+        if not self._conn.in_transaction:
+            # Releasing a savepoint that opened the transaction would commit
+            self._conn.execute("BEGIN IMMEDIATE")
+        self._conn.execute("SAVEPOINT ref_update")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK TO ref_update")
+            self._conn.execute("RELEASE ref_update")
+            raise
+        self._conn.execute("RELEASE ref_update")
 
     def allkeys(self) -> set[Ref]:
         rows = self._conn.execute("SELECT name FROM refs").fetchall()
-        return {bytes(row[0]) for row in rows}
+        return {row[0] for row in rows}
 
     def read_loose_ref(self, name: Ref) -> bytes | None:
         row = self._conn.execute(
@@ -28,7 +65,7 @@ class SqliteRefsContainer(RefsContainer):
         ).fetchone()
         if row is None:
             return None
-        return bytes(row[0])
+        return row[0]
 
     def get_packed_refs(self) -> dict[Ref, ObjectID]:
         return {}
@@ -43,26 +80,21 @@ class SqliteRefsContainer(RefsContainer):
         message: bytes | None = None,
     ) -> None:
         new = SYMREF + other
-        self._conn.execute("BEGIN IMMEDIATE")
-        try:
+        with self._write():
             old = self.follow(name)[-1]
             self._conn.execute(
                 "INSERT OR REPLACE INTO refs (name, value) VALUES (?, ?)",
                 (name, new),
             )
-            self._conn.commit()
-        except BaseException:
-            self._conn.rollback()
-            raise
-        self._log(
-            name,
-            old,
-            new,
-            committer=committer,
-            timestamp=timestamp,
-            timezone=timezone,
-            message=message,
-        )
+            self._log(
+                name,
+                old,
+                new,
+                committer=committer,
+                timestamp=timestamp,
+                timezone=timezone,
+                message=message,
+            )
 
     def set_if_equals(
         self,
@@ -75,57 +107,51 @@ class SqliteRefsContainer(RefsContainer):
         message: bytes | None = None,
     ) -> bool:
         self._check_refname(name)
-        if old_ref is None:
-            # Unconditional set — grab old value for logging, then upsert.
-            # BEGIN IMMEDIATE ensures the read and write are atomic.
-            self._conn.execute("BEGIN IMMEDIATE")
-            try:
+        # The reflog entry is written in the same transaction as the ref,
+        # so each update costs one commit.
+        with self._write():
+            if old_ref is None:
+                # Unconditional set — grab old value for logging, then upsert.
+                # _write() makes the read and write atomic.
                 row = self._conn.execute(
                     "SELECT value FROM refs WHERE name = ?", (name,)
                 ).fetchone()
-                old = bytes(row[0]) if row is not None else None
+                old = row[0] if row is not None else None
                 self._conn.execute(
                     "INSERT OR REPLACE INTO refs (name, value) VALUES (?, ?)",
                     (name, new_ref),
                 )
-                self._conn.commit()
-            except BaseException:
-                self._conn.rollback()
-                raise
-        else:
-            # Atomic compare-and-swap: UPDATE only the row matching both
-            # name and expected old value in a single statement.
-            old = old_ref
-            cursor = self._conn.execute(
-                "UPDATE refs SET value = ? WHERE name = ? AND value = ?",
-                (new_ref, name, old_ref),
-            )
-            self._conn.commit()
-            if cursor.rowcount == 0:
-                # Either the ref doesn't exist, or its value didn't match.
-                # Check if the caller expected ZERO_SHA (i.e. ref absent):
-                if old_ref == ZERO_SHA:
+            else:
+                # Atomic compare-and-swap: UPDATE only the row matching both
+                # name and expected old value in a single statement.
+                old = old_ref
+                cursor = self._conn.execute(
+                    "UPDATE refs SET value = ? WHERE name = ? AND value = ?",
+                    (new_ref, name, old_ref),
+                )
+                if cursor.rowcount == 0:
+                    # Either the ref doesn't exist, or its value didn't match.
+                    # Check if the caller expected ZERO_SHA (i.e. ref absent):
+                    if old_ref != ZERO_SHA:
+                        return False
                     # Ref should not exist — try atomic insert.
                     try:
                         self._conn.execute(
                             "INSERT INTO refs (name, value) VALUES (?, ?)",
                             (name, new_ref),
                         )
-                        self._conn.commit()
-                        old = None
                     except sqlite3.IntegrityError:
                         return False
-                else:
-                    return False
-        self._log(
-            name,
-            old,
-            new_ref,
-            committer=committer,
-            timestamp=timestamp,
-            timezone=timezone,
-            message=message,
-        )
+                    old = None
+            self._log(
+                name,
+                old,
+                new_ref,
+                committer=committer,
+                timestamp=timestamp,
+                timezone=timezone,
+                message=message,
+            )
         return True
 
     def add_if_new(
@@ -137,25 +163,25 @@ class SqliteRefsContainer(RefsContainer):
         timezone: int | None = None,
         message: bytes | None = None,
     ) -> bool:
-        # Atomic insert — relies on PRIMARY KEY constraint to reject
-        # duplicates without a separate SELECT.
-        try:
-            self._conn.execute(
-                "INSERT INTO refs (name, value) VALUES (?, ?)",
-                (name, ref),
+        with self._write():
+            # Atomic insert — relies on PRIMARY KEY constraint to reject
+            # duplicates without a separate SELECT.
+            try:
+                self._conn.execute(
+                    "INSERT INTO refs (name, value) VALUES (?, ?)",
+                    (name, ref),
+                )
+            except sqlite3.IntegrityError:
+                return False
+            self._log(
+                name,
+                None,
+                ref,
+                committer=committer,
+                timestamp=timestamp,
+                timezone=timezone,
+                message=message,
             )
-            self._conn.commit()
-        except sqlite3.IntegrityError:
-            return False
-        self._log(
-            name,
-            None,
-            ref,
-            committer=committer,
-            timestamp=timestamp,
-            timezone=timezone,
-            message=message,
-        )
         return True
 
     def remove_if_equals(
@@ -167,40 +193,41 @@ class SqliteRefsContainer(RefsContainer):
         timezone: int | None = None,
         message: bytes | None = None,
     ) -> bool:
-        if old_ref is None:
-            # Unconditional delete — grab old value for logging.
-            # BEGIN IMMEDIATE ensures the read and write are atomic.
-            self._conn.execute("BEGIN IMMEDIATE")
-            try:
+        with self._write():
+            if old_ref is None and _HAS_RETURNING:
+                # Unconditional delete — RETURNING yields the old value for
+                # logging from the same atomic statement.
+                rows = self._conn.execute(
+                    "DELETE FROM refs WHERE name = ? RETURNING value", (name,)
+                ).fetchall()
+                old = rows[0][0] if rows else None
+            elif old_ref is None:
+                # Unconditional delete — read the old value for logging in
+                # the same transaction.
                 row = self._conn.execute(
                     "SELECT value FROM refs WHERE name = ?", (name,)
                 ).fetchone()
-                old = bytes(row[0]) if row is not None else None
+                old = row[0] if row is not None else None
                 self._conn.execute("DELETE FROM refs WHERE name = ?", (name,))
-                self._conn.commit()
-            except BaseException:
-                self._conn.rollback()
-                raise
-        else:
-            # Atomic compare-and-delete in a single statement.
-            old = old_ref
-            cursor = self._conn.execute(
-                "DELETE FROM refs WHERE name = ? AND value = ?",
-                (name, old_ref),
-            )
-            self._conn.commit()
-            if cursor.rowcount == 0:
-                return False
-        if old is not None:
-            self._log(
-                name,
-                old,
-                None,
-                committer=committer,
-                timestamp=timestamp,
-                timezone=timezone,
-                message=message,
-            )
+            else:
+                # Atomic compare-and-delete in a single statement.
+                old = old_ref
+                cursor = self._conn.execute(
+                    "DELETE FROM refs WHERE name = ? AND value = ?",
+                    (name, old_ref),
+                )
+                if cursor.rowcount == 0:
+                    return False
+            if old is not None:
+                self._log(
+                    name,
+                    old,
+                    None,
+                    committer=committer,
+                    timestamp=timestamp,
+                    timezone=timezone,
+                    message=message,
+                )
         return True
 
     def get_peeled(self, name: Ref) -> ObjectID | None:
@@ -209,4 +236,4 @@ class SqliteRefsContainer(RefsContainer):
         ).fetchone()
         if row is None:
             return None
-        return bytes(row[0])
+        return row[0]
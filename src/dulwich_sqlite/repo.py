@@ -4,6 +4,7 @@ import sqlite3
 import sys
 import time
 from collections.abc import Generator
+from contextlib import AbstractContextManager
 from io import BytesIO
 
 from dulwich import porcelain, reflog
@@ -13,22 +14,50 @@ from dulwich.repo import BaseRepo
 from ._schema import (
     SCHEMA_VERSION,
     apply_pragmas,
+    connect,
     init_db,
+    optimize_db,
 )
 from .object_store import SqliteObjectStore
 from .refs import SqliteRefsContainer
 
 
+# Rows re-compressed per batch by train_dictionary()
+_RECOMPRESS_BATCH_SIZE = 1000
+# train_dictionary() samples at most this many raw bytes per dictionary
+# byte (zstd recommends ~100x the dictionary size)
+_SAMPLE_BYTES_PER_DICT_BYTE = 100
+# ...and reads at most this many rows per dictionary type.  Rows come in
+# rowid order, so the oldest objects are sampled first.
+_SAMPLE_MAX_ROWS = 10000
+
+# Reflog and named-file SQL, shared by every call site (see object_store.py)
+_INSERT_REFLOG_SQL = (
+    "INSERT INTO reflog (ref_name, old_sha, new_sha, committer, timestamp, timezone, message) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+_SELECT_REFLOG_SQL = (
+    "SELECT old_sha, new_sha, committer, timestamp, timezone, message "
+    "FROM reflog WHERE ref_name = ? ORDER BY id ASC"
+)
+_SELECT_NAMED_FILE_SQL = "SELECT contents FROM named_files WHERE path = ?"
+_PUT_NAMED_FILE_SQL = "INSERT OR REPLACE INTO named_files (path, contents) VALUES (?, ?)"
+_DELETE_NAMED_FILE_SQL = "DELETE FROM named_files WHERE path = ?"
+
+
 class SqliteRepo(BaseRepo):
     """Git repository backed by a SQLite database.
 
     Always bare: no working tree or index.
     """
 
-    def __init__(self, db_path: str) -> None:
+    def __init__(
+        self, db_path: str, *, conn: sqlite3.Connection | None = None
+    ) -> None:
         self._db_path = db_path
         self.path = db_path
-        self._conn = sqlite3.connect(db_path)
+        # An open connection to db_path may be handed over (init_bare does)
+        self._conn = conn if conn is not None else connect(db_path)
         try:
             apply_pragmas(self._conn)
             self._verify_schema()
@@ -41,7 +70,11 @@ class SqliteRepo(BaseRepo):
                 f"Not a dulwich-sqlite repository: {self._db_path}"
             )
         object_store = SqliteObjectStore(self._conn)
-        refs_container = SqliteRefsContainer(self._conn, logger=self._write_reflog)
+        refs_container = SqliteRefsContainer(
+            self._conn,
+            logger=self._write_reflog,
+            in_batch=lambda: object_store._batch_depth > 0,
+        )
         super().__init__(object_store, refs_container)
         self.bare = True
         self._load_config()
@@ -87,23 +120,16 @@ class SqliteRepo(BaseRepo):
         if timezone is None:
             timezone = 0
         self._conn.execute(
-            "INSERT INTO reflog (ref_name, old_sha, new_sha, committer, timestamp, timezone, message) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            _INSERT_REFLOG_SQL,
             (ref, old_sha, new_sha, committer, timestamp, timezone, message),
         )
-        self._conn.commit()
+        # No commit: the refs container commits the ref update and this
+        # entry together.
 
     def read_reflog(self, ref: bytes) -> Generator[reflog.Entry, None, None]:
-        rows = self._conn.execute(
-            "SELECT old_sha, new_sha, committer, timestamp, timezone, message "
-            "FROM reflog WHERE ref_name = ? ORDER BY id ASC",
-            (ref,),
-        ).fetchall()
-        for row in rows:
-            yield reflog.Entry(
-                bytes(row[0]), bytes(row[1]), bytes(row[2]),
-                row[3], row[4], bytes(row[5]),
-            )
+        # Stream from the cursor; consume on the thread that owns the repo
+        for row in self._conn.execute(_SELECT_REFLOG_SQL, (ref,)):
+            yield reflog.Entry(*row)
 
     def _load_config(self) -> None:
         from dulwich.config import ConfigFile
@@ -116,18 +142,20 @@ class SqliteRepo(BaseRepo):
 
     @classmethod
     def init_bare(cls, db_path: str, *, compress: bool | str = False) -> "SqliteRepo":
-        conn = sqlite3.connect(db_path)
+        conn = connect(db_path)
         init_db(conn)
-        if compress:
-            method = compress if isinstance(compress, str) else "zstd"
-            conn.execute(
-                "UPDATE metadata SET value = ? WHERE key = 'compression'",
-                (method,),
-            )
-            conn.commit()
-        conn.close()
-        repo = cls(db_path)
-        repo._init_files(bare=True)
+        # Keep the connection (and its caches) rather than reopening, and
+        # write the settings and default named files in one transaction.
+        repo = cls(db_path, conn=conn)
+        with repo.batch():
+            if compress:
+                method = compress if isinstance(compress, str) else "zstd"
+                conn.execute(
+                    "UPDATE metadata SET value = ? WHERE key = 'compression'",
+                    (method,),
+                )
+                repo.object_store._compression = method
+            repo._init_files(bare=True)
         return repo
 
     def enable_compression(self, method: str = "zlib") -> None:
@@ -137,14 +165,14 @@ class SqliteRepo(BaseRepo):
             "UPDATE metadata SET value = ? WHERE key = 'compression'",
             (method,),
         )
-        self._conn.commit()
+        self._commit()
         self.object_store._compression = method
 
     def disable_compression(self) -> None:
         self._conn.execute(
             "UPDATE metadata SET value = 'none' WHERE key = 'compression'"
         )
-        self._conn.commit()
+        self._commit()
         self.object_store._compression = "none"
 
     def get_named_file(
@@ -153,26 +181,35 @@ class SqliteRepo(BaseRepo):
         basedir: str | None = None,
     ) -> BytesIO | None:
         path_str = path.decode() if isinstance(path, bytes) else path
-        row = self._conn.execute(
-            "SELECT contents FROM named_files WHERE path = ?",
-            (path_str,),
-        ).fetchone()
-        if row is None:
+        contents = self._named_file_contents(path_str)
+        if contents is None:
             return None
-        return BytesIO(bytes(row[0]))
+        return BytesIO(contents)
+
+    def _named_file_contents(self, path: str) -> bytes | None:
+        """Return a named file's contents, or None if it does not exist."""
+        row = self._conn.execute(_SELECT_NAMED_FILE_SQL, (path,)).fetchone()
+        return None if row is None else row[0]
 
     def _put_named_file(self, path: str, contents: bytes) -> None:
-        self._conn.execute(
-            "INSERT OR REPLACE INTO named_files (path, contents) VALUES (?, ?)",
-            (path, contents),
-        )
-        self._conn.commit()
+        self._conn.execute(_PUT_NAMED_FILE_SQL, (path, contents))
+        self._commit()
 
     def _del_named_file(self, path: str) -> None:
-        self._conn.execute(
-            "DELETE FROM named_files WHERE path = ?", (path,)
-        )
-        self._conn.commit()
+        self._conn.execute(_DELETE_NAMED_FILE_SQL, (path,))
+        self._commit()
+
+    def _commit(self) -> None:
+        """Commit now, unless inside ``batch()``, which commits later."""
+        if not self.object_store._batch_depth:
+            self._conn.commit()
+
+    def batch(self) -> AbstractContextManager[None]:
+        """Group object, ref, reflog and named-file writes into one transaction.
+
+        See :meth:`SqliteObjectStore.batch`.
+        """
+        return self.object_store.batch()
 
     def _init_config(self, config: "ConfigFile") -> None:
         from dulwich.config import ConfigFile
@@ -183,10 +220,7 @@ class SqliteRepo(BaseRepo):
         return self._config
 
     def get_description(self) -> bytes | None:
-        f = self.get_named_file("description")
-        if f is None:
-            return None
-        return f.read()
+        return self._named_file_contents("description")
 
     def set_description(self, description: bytes) -> None:
         self._put_named_file("description", description)
@@ -358,24 +392,31 @@ class SqliteRepo(BaseRepo):
 
         from .object_store import _TYPE_TO_DICT_KEY
 
-        # 1. Sample by type
-        commit_samples: list[bytes] = []
-        tree_samples: list[bytes] = []
-        for row in self._conn.execute(
-            "SELECT type_num, data, compression FROM objects "
-            "WHERE data IS NOT NULL LIMIT 15000"
-        ):
-            raw = self.object_store._decompress(bytes(row[1]), row[2])
-            if row[0] == 1:
-                commit_samples.append(raw)
-            elif row[0] == 2:
-                tree_samples.append(raw)
-
-        chunk_samples: list[bytes] = []
-        for row in self._conn.execute(
-            "SELECT data, compression FROM chunks LIMIT 10000"
-        ):
-            chunk_samples.append(self.object_store._decompress(bytes(row[0]), row[1]))
+        # 1. Sample by type.  Each query only returns rows of the wanted
+        # type, and sampling stops once the byte budget for that dict is
+        # reached, so memory stays bounded however large the store is.
+        budget = dict_size * _SAMPLE_BYTES_PER_DICT_BYTE
+
+        def sample(sql: str, params: tuple = ()) -> list[bytes]:
+            samples: list[bytes] = []
+            total = 0
+            for data, method in self._conn.execute(sql, params):
+                raw = self.object_store._decompress(data, method)
+                samples.append(raw)
+                total += len(raw)
+                if total >= budget:
+                    break
+            return samples
+
+        object_sql = (
+            "SELECT data, compression FROM objects "
+            "WHERE type_num = ? AND data IS NOT NULL LIMIT ?"
+        )
+        commit_samples = sample(object_sql, (1, _SAMPLE_MAX_ROWS))
+        tree_samples = sample(object_sql, (2, _SAMPLE_MAX_ROWS))
+        chunk_samples = sample(
+            "SELECT data, compression FROM chunks LIMIT ?", (_SAMPLE_MAX_ROWS,)
+        )
 
         # 2. Train type-specific dicts (min 10 samples each)
         new_dicts: dict[str, zstandard.ZstdCompressionDict] = {}
@@ -400,39 +441,63 @@ class SqliteRepo(BaseRepo):
             zdict.precompute_compress(level=3)
             self.object_store._zstd_dicts[key] = zdict
             self.object_store._zstd_dicts_by_id[zdict.dict_id()] = zdict
+            self.object_store._zstd_decompressors.pop(zdict.dict_id(), None)
+            self.object_store._zstd_compressors.pop(key, None)
+
+        # 5. Re-compress all zstd data with type-specific dicts.  Rows are
+        # paged by rowid so peak memory is one batch, not the whole table;
+        # each page is re-compressed on the thread pool and written with
+        # one executemany.
+        store = self.object_store
 
-        # 5. Re-compress all zstd data with type-specific dicts
         with self._conn:
             # Inline objects
-            for row in self._conn.execute(
-                "SELECT sha, type_num, data, compression FROM objects "
-                "WHERE data IS NOT NULL AND compression = 'zstd'"
+            last = 0
+            while rows := self._conn.execute(
+                "SELECT rowid, type_num, data, compression FROM objects "
+                "WHERE rowid > ? AND data IS NOT NULL AND compression = 'zstd' "
+                "ORDER BY rowid LIMIT ?",
+                (last, _RECOMPRESS_BATCH_SIZE),
             ).fetchall():
-                sha, type_num, old_data, comp = row
-                raw = self.object_store._decompress(bytes(old_data), comp)
-                dict_key = _TYPE_TO_DICT_KEY.get(type_num)
-                new_data = self.object_store._compress(raw, dict_key=dict_key)
-                self._conn.execute("UPDATE objects SET data = ? WHERE sha = ?",
-                                   (new_data, bytes(sha)))
+                new_data = store._recompress_rows([
+                    (old_data, comp, _TYPE_TO_DICT_KEY.get(type_num))
+                    for _, type_num, old_data, comp in rows
+                ])
+                self._conn.executemany(
+                    "UPDATE objects SET data = ? WHERE rowid = ?",
+                    zip(new_data, (row[0] for row in rows)),
+                )
+                last = rows[-1][0]
             # Chunks
-            for row in self._conn.execute(
-                "SELECT rowid, data, compression FROM chunks WHERE compression = 'zstd'"
+            last = 0
+            while rows := self._conn.execute(
+                "SELECT rowid, data, compression FROM chunks "
+                "WHERE rowid > ? AND compression = 'zstd' ORDER BY rowid LIMIT ?",
+                (last, _RECOMPRESS_BATCH_SIZE),
             ).fetchall():
-                rowid, old_data, comp = row
-                raw = self.object_store._decompress(bytes(old_data), comp)
-                new_data = self.object_store._compress(raw, dict_key='chunk')
-                self._conn.execute("UPDATE chunks SET data = ? WHERE rowid = ?",
-                                   (new_data, rowid))
+                new_data = store._recompress_rows([
+                    (old_data, comp, 'chunk') for _, old_data, comp in rows
+                ])
+                self._conn.executemany(
+                    "UPDATE chunks SET data = ? WHERE rowid = ?",
+                    zip(new_data, (row[0] for row in rows)),
+                )
+                last = rows[-1][0]
 
         # 6. Remove legacy single dict
-        self._conn.execute("DELETE FROM named_files WHERE path = '_zstd_dict'")
+        self._conn.execute(_DELETE_NAMED_FILE_SQL, ("_zstd_dict",))
         self._conn.commit()
         self.object_store._zstd_dicts.pop('legacy', None)
 
-        # 7. Reclaim freed pages from re-compression
+        # 7. Reclaim freed pages from re-compression and refresh statistics
         self._conn.execute("VACUUM")
+        optimize_db(self._conn)
 
     def close(self) -> None:
+        try:
+            optimize_db(self._conn)
+        except sqlite3.Error:
+            pass  # best effort: already closed, or another writer holds the lock
         self.object_store.close()
         self._conn.close()
 
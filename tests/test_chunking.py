@@ -1,9 +1,11 @@
 """Unit tests for the _chunking module."""
 
 import hashlib
+import zlib
 
 from dulwich_sqlite._chunking import (
     CHUNKING_THRESHOLD,
+    PARALLEL_HASH_THRESHOLD,
     chunk_binary,
     chunk_blob,
     chunk_text,
@@ -75,6 +77,23 @@ class TestChunkText:
         for _, chunk_data in chunks[:-1]:  # last chunk can be smaller
             assert len(chunk_data) <= 4096 + 501  # max + one line overshoot
 
+    def test_cut_points_follow_crc32_rule(self):
+        # Boundaries must stay stable so existing chunks keep deduplicating
+        data = b"".join(f"row {i} {'y' * (i % 97)}\n".encode() for i in range(2000))
+        expected = []
+        current = b""
+        count = 0
+        for line in data.splitlines(keepends=True):
+            current += line
+            count += 1
+            if len(current) >= 4096 or (count >= 3 and zlib.crc32(line) & 0x7 == 0):
+                expected.append(current)
+                current = b""
+                count = 0
+        if current:
+            expected.append(current)
+        assert [c[1] for c in chunk_text(data)] == expected
+
 
 class TestChunkBinary:
     def _random_binary(self, size=51200, seed=42):
@@ -100,6 +119,14 @@ class TestChunkBinary:
         for sha_bin, chunk_data in chunks:
             assert sha_bin == hashlib.sha256(chunk_data).digest()
 
+    def test_parallel_hashing_large_blob(self):
+        import random
+        data = random.Random(7).randbytes(PARALLEL_HASH_THRESHOLD * 2)
+        chunks = chunk_binary(data)
+        assert b"".join(c[1] for c in chunks) == data
+        for sha_bin, chunk_data in chunks:
+            assert sha_bin == hashlib.sha256(chunk_data).digest()
+
 
 class TestChunkBlob:
     def test_small_blob_returns_none(self):
@@ -110,6 +110,18 @@ class TestChunksInDB:
             expected_sha = hashlib.sha256(raw).digest()
             assert bytes(chunk_sha) == expected_sha
 
+    def test_incompressible_chunks_stored_raw(self, compressed_store):
+        import random
+        data = b"\x00" + random.Random(3).randbytes(51200)
+        blob = Blob.from_string(data)
+        compressed_store.add_object(blob)
+        rows = compressed_store._conn.execute(
+            "SELECT DISTINCT compression FROM chunks"
+        ).fetchall()
+        assert rows == [("none",)]
+        _, retrieved = compressed_store.get_raw(blob.id)
+        assert retrieved == data
+
 
 class TestDedup:
     def test_dedup_across_compression_toggle(self, tmp_path):
@@ -235,6 +247,13 @@ class TestSearchCompressed:
         results = repo.object_store.search_content("searchable_keyword")
         assert blob.id in results
 
+    def test_search_compressed_is_case_insensitive(self, repo):
+        small = Blob.from_string(b"Inline KEYWORD here")
+        large = Blob.from_string(_large_text("Chunked_Keyword"))
+        repo.object_store.add_objects([(small, None), (large, None)])
+        assert small.id in repo.object_store.search_content("inline keyword")
+        assert large.id in repo.object_store.search_content("CHUNKED_KEYWORD")
+
     def test_search_mixed(self, tmp_path):
         db = str(tmp_path / "search_mixed.db")
         repo = SqliteRepo.init_bare(db)
@@ -609,6 +628,177 @@ class TestZstdCompression:
         finally:
             repo.close()
 
+    def test_recompression_pages_through_all_rows(self, tmp_path, monkeypatch):
+        """Every zstd row is re-compressed even when spread over many pages."""
+        import zstandard
+
+        import dulwich_sqlite.repo
+
+        monkeypatch.setattr(dulwich_sqlite.repo, "_RECOMPRESS_BATCH_SIZE", 3)
+        db = str(tmp_path / "paged.db")
+        repo = SqliteRepo.init_bare(db, compress="zstd")
+        try:
+            blobs = [Blob.from_string(_large_text(f"paged_{i}")) for i in range(15)]
+            repo.object_store.add_objects([(b, None) for b in blobs])
+            repo.train_dictionary()
+
+            for (data,) in repo._conn.execute(
+                "SELECT data FROM chunks WHERE compression = 'zstd'"
+            ):
+                assert zstandard.get_frame_parameters(bytes(data)).dict_id != 0
+            for blob in blobs:
+                assert repo.object_store[blob.id].data == blob.data
+        finally:
+            repo.close()
+
+    def test_retraining_refreshes_cached_compressors(self, tmp_path):
+        """Objects added after a retrain are compressed with the new dicts."""
+        import zstandard
+
+        db = str(tmp_path / "retrain.db")
+        repo = SqliteRepo.init_bare(db, compress="zstd")
+        try:
+            store = repo.object_store
+            store.add_objects(
+                [(Blob.from_string(_large_text(f"first_{i}")), None) for i in range(15)]
+            )
+            repo.train_dictionary()
+            store.add_object(Blob.from_string(_large_text("between")))
+            store.add_objects(
+                [(Blob.from_string(_large_text(f"second_{i}")), None) for i in range(15)]
+            )
+            repo.train_dictionary()
+            chunk_dict_id = store._zstd_dicts['chunk'].dict_id()
+
+            blob = Blob.from_string(_large_text("after_retrain"))
+            store.add_object(blob)
+            sha_bin = bytes.fromhex(blob.id.decode("ascii"))
+            (refs,) = repo._conn.execute(
+                "SELECT chunk_refs FROM objects WHERE sha = ?", (sha_bin,)
+            ).fetchone()
+            for rowid in unpack_chunk_refs(bytes(refs)):
+                data, comp = repo._conn.execute(
+                    "SELECT data, compression FROM chunks WHERE rowid = ?", (rowid,)
+                ).fetchone()
+                if comp == "zstd":
+                    params = zstandard.get_frame_parameters(bytes(data))
+                    assert params.dict_id == chunk_dict_id
+            assert store[blob.id].data == blob.data
+        finally:
+            repo.close()
+
+
+class TestParallelChunkCodec:
+    @pytest.mark.parametrize("compress", ["zlib", "zstd"])
+    def test_parallel_compress_matches(self, tmp_path, monkeypatch, compress):
+        import dulwich_sqlite.object_store
+
+        monkeypatch.setattr(dulwich_sqlite.object_store, "PARALLEL_COMPRESS_MIN_CHUNKS", 2)
+        monkeypatch.setattr(dulwich_sqlite.object_store.os, "cpu_count", lambda: 4)
+        repo = SqliteRepo.init_bare(str(tmp_path / "parc.db"), compress=compress)
+        try:
+            store = repo.object_store
+            blobs = [Blob.from_string(_large_text(f"pcompress_{i}")) for i in range(10)]
+            store.add_objects([(b, None) for b in blobs])
+            assert repo._conn.execute(
+                "SELECT count(*) FROM chunks WHERE compression = ?", (compress,)
+            ).fetchone()[0] > 0
+            if compress == "zstd":
+                repo.train_dictionary()
+                blob = Blob.from_string(_large_text("after_training"))
+                store.add_object(blob)
+                blobs.append(blob)
+            for blob in blobs:
+                assert store.get_raw(blob.id) == (3, blob.data)
+        finally:
+            repo.close()
+
+    @pytest.mark.parametrize("compress", ["zlib", "zstd"])
+    def test_parallel_read_matches(self, tmp_path, monkeypatch, compress):
+        import dulwich_sqlite.object_store
+
+        monkeypatch.setattr(dulwich_sqlite.object_store, "PARALLEL_DECOMPRESS_MIN_CHUNKS", 2)
+        monkeypatch.setattr(dulwich_sqlite.object_store.os, "cpu_count", lambda: 4)
+        repo = SqliteRepo.init_bare(str(tmp_path / "par.db"), compress=compress)
+        try:
+            blobs = [Blob.from_string(_large_text(f"parallel_{i}")) for i in range(10)]
+            repo.object_store.add_objects([(b, None) for b in blobs])
+            if compress == "zstd":
+                repo.train_dictionary()
+            for blob in blobs:
+                assert repo.object_store.get_raw(blob.id) == (3, blob.data)
+        finally:
+            repo.close()
+
+    def test_parallel_read_after_disabling_compression(self, tmp_path, monkeypatch):
+        import dulwich_sqlite.object_store
+
+        monkeypatch.setattr(dulwich_sqlite.object_store, "PARALLEL_DECOMPRESS_MIN_CHUNKS", 2)
+        monkeypatch.setattr(dulwich_sqlite.object_store.os, "cpu_count", lambda: 4)
+        repo = SqliteRepo.init_bare(str(tmp_path / "toggled.db"), compress="zlib")
+        try:
+            store = repo.object_store
+            blob = Blob.from_string(_large_text("toggled"))
+            store.add_object(blob)
+            repo.disable_compression()
+            calls = []
+            decompress_rows = store._decompress_rows
+            monkeypatch.setattr(
+                store,
+                "_decompress_rows",
+                lambda rows: calls.append(len(rows)) or decompress_rows(rows),
+            )
+            assert store.get_raw(blob.id) == (3, blob.data)
+            assert calls
+        finally:
+            repo.close()
+
+    def test_parallel_recompress_uses_new_dicts(self, tmp_path, monkeypatch):
+        import zstandard
+        from dulwich.objects import Tree
+
+        import dulwich_sqlite.object_store
+
+        monkeypatch.setattr(dulwich_sqlite.object_store, "PARALLEL_COMPRESS_MIN_CHUNKS", 2)
+        monkeypatch.setattr(dulwich_sqlite.object_store, "PARALLEL_COMPRESS_THRESHOLD", 32)
+        monkeypatch.setattr(dulwich_sqlite.object_store.os, "cpu_count", lambda: 4)
+        repo = SqliteRepo.init_bare(str(tmp_path / "parrec.db"), compress="zstd")
+        try:
+            store = repo.object_store
+            objects = []
+            for i in range(20):
+                blob = Blob.from_string(f"content {i} ".encode() * 20)
+                tree = Tree()
+                tree.add(f"f_{i}.txt".encode(), 0o100644, blob.id)
+                objects += [blob, tree]
+            store.add_objects([(o, None) for o in objects])
+            repo.train_dictionary()
+            tree_dict_id = store._zstd_dicts["tree"].dict_id()
+            for (data,) in repo._conn.execute(
+                "SELECT data FROM objects WHERE type_num = 2"
+            ):
+                assert zstandard.get_frame_parameters(data).dict_id == tree_dict_id
+            for obj in objects:
+                assert store.get_raw(obj.id) == (obj.type_num, obj.as_raw_string())
+        finally:
+            repo.close()
+
+    def test_serial_recompress_reuses_cached_contexts(self, tmp_path, monkeypatch):
+        import dulwich_sqlite.object_store
+
+        monkeypatch.setattr(dulwich_sqlite.object_store.os, "cpu_count", lambda: 1)
+        repo = SqliteRepo.init_bare(str(tmp_path / "serrec.db"), compress="zstd")
+        try:
+            store = repo.object_store
+            blobs = [Blob.from_string(_large_text(f"serial_{i}")) for i in range(10)]
+            store.add_objects([(b, None) for b in blobs])
+            repo.train_dictionary()
+            assert "chunk" in store._zstd_compressors
+            for blob in blobs:
+                assert store.get_raw(blob.id) == (3, blob.data)
+        finally:
+            repo.close()
+
 
 class TestChunkRefs:
     def test_chunk_refs_packed_correctly(self, tmp_path):
@@ -645,6 +835,68 @@ class TestChunkRefs:
             repo.close()
 
 class TestInlineCompression:
+    def test_large_inline_object_multithreaded_zstd(self, tmp_path, monkeypatch):
+        """Large inline payloads use the worker-thread compressor and round-trip."""
+        import zstandard
+        from dulwich.objects import Tree
+
+        import dulwich_sqlite.object_store
+
+        monkeypatch.setattr(dulwich_sqlite.object_store.os, "cpu_count", lambda: 4)
+        repo = SqliteRepo.init_bare(str(tmp_path / "mt.db"), compress="zstd")
+        try:
+            blob = Blob.from_string(b"content")
+            tree = Tree()
+            for i in range(12000):
+                tree.add(f"file_{i:05d}.txt".encode(), 0o100644, blob.id)
+            assert len(tree.as_raw_string()) >= dulwich_sqlite.object_store.PARALLEL_COMPRESS_THRESHOLD
+            repo.object_store.add_object(tree)
+            sha_bin = bytes.fromhex(tree.id.decode("ascii"))
+            data, compression = repo._conn.execute(
+                "SELECT data, compression FROM objects WHERE sha = ?", (sha_bin,)
+            ).fetchone()
+            assert compression == "zstd"
+            assert zstandard.get_frame_parameters(bytes(data)).dict_id == 0
+            assert repo.object_store[tree.id].as_raw_string() == tree.as_raw_string()
+            assert repo.object_store._zstd_mt_compressor is not None
+        finally:
+            repo.close()
+
+    def test_large_inline_object_keeps_trained_dict(self, tmp_path, monkeypatch):
+        """Payloads with a trained dictionary skip the dict-less MT compressor."""
+        import zstandard
+        from dulwich.objects import Tree
+
+        import dulwich_sqlite.object_store
+
+        monkeypatch.setattr(dulwich_sqlite.object_store, "PARALLEL_COMPRESS_THRESHOLD", 32)
+        monkeypatch.setattr(dulwich_sqlite.object_store.os, "cpu_count", lambda: 4)
+        repo = SqliteRepo.init_bare(str(tmp_path / "mtdict.db"), compress="zstd")
+        try:
+            store = repo.object_store
+            trees = []
+            for i in range(20):
+                blob = Blob.from_string(f"content {i}".encode())
+                tree = Tree()
+                tree.add(f"f_{i}.txt".encode(), 0o100644, blob.id)
+                trees.append(tree)
+            store.add_objects([(t, None) for t in trees])
+            repo.train_dictionary()
+            tree_dict_id = store._zstd_dicts["tree"].dict_id()
+            big = Tree()
+            for i in range(50):
+                big.add(f"file_{i:05d}.txt".encode(), 0o100644, trees[0].id)
+            store.add_object(big)
+            for tree in trees + [big]:
+                (data,) = repo._conn.execute(
+                    "SELECT data FROM objects WHERE sha = ?",
+                    (bytes.fromhex(tree.id.decode("ascii")),),
+                ).fetchone()
+                assert zstandard.get_frame_parameters(data).dict_id == tree_dict_id
+                assert store[tree.id].as_raw_string() == tree.as_raw_string()
+        finally:
+            repo.close()
+
     def test_inline_object_compressed(self, tmp_path):
         """Verify commit/tree objects are compressed when compression is enabled."""
         from dulwich.objects import Commit, Tree
@@ -725,6 +977,19 @@ class TestByteRangeAccess:
         finally:
             repo.close()
 
+    @pytest.mark.parametrize("offset,length", [(0, 0), (5, 10), (495, 10), (600, 5), (-3, 2)])
+    def test_range_read_uncompressed_inline_matches_slice(self, tmp_path, offset, length):
+        """Uncompressed inline reads (via blobopen) agree with slicing."""
+        repo = SqliteRepo.init_bare(str(tmp_path / "range_blob.db"))
+        try:
+            data = b"0123456789" * 50
+            blob = Blob.from_string(data)
+            repo.object_store.add_object(blob)
+            _, ranged = repo.object_store.get_raw_range(blob.id, offset, length)
+            assert ranged == data[offset : offset + length]
+        finally:
+            repo.close()
+
     def test_range_read_inline_object(self, tmp_path):
         """Read a range from a small inline blob."""
         db = str(tmp_path / "range_inline.db")
@@ -926,3 +1191,34 @@ class TestByteRangeAccess:
                 assert raw_size > 0
         finally:
             repo.close()
+
+
+class TestOpenRaw:
+    @pytest.mark.parametrize("compress", [False, "zlib", "zstd"])
+    def test_stream_chunked_object(self, tmp_path, compress):
+        db = str(tmp_path / "stream.db")
+        repo = SqliteRepo.init_bare(db, compress=compress)
+        try:
+            data = _large_text("stream", n=800)
+            blob = Blob.from_string(data)
+            repo.object_store.add_object(blob)
+
+            type_num, stream = repo.object_store.open_raw(blob.id)
+            with stream:
+                assert type_num == 3
+                assert stream.read(10) == data[:10]
+                assert stream.read() == data[10:]
+                assert stream.read() == b""
+        finally:
+            repo.close()
+
+    def test_stream_inline_object(self, sqlite_repo):
+        blob = Blob.from_string(b"hello world")
+        sqlite_repo.object_store.add_object(blob)
+        type_num, stream = sqlite_repo.object_store.open_raw(blob.id)
+        assert type_num == 3
+        assert stream.read() == b"hello world"
+
+    def test_missing_object_raises(self, sqlite_repo):
+        with pytest.raises(KeyError):
+            sqlite_repo.object_store.open_raw(b"0" * 40)
@@ -72,6 +72,16 @@ class TestChunkedStorageRoundtrip:
         assert row[0] is None
         assert row[1] == len(data)
 
+    def test_shas_stored_as_binary_blobs(self, store):
+        data = b"".join(f"line {i} of the file\n".encode() for i in range(500))
+        store.add_object(Blob.from_string(data))
+        assert store._conn.execute(
+            "SELECT DISTINCT typeof(sha), length(sha) FROM objects"
+        ).fetchall() == [("blob", 20)]
+        assert store._conn.execute(
+            "SELECT DISTINCT typeof(chunk_sha), length(chunk_sha) FROM chunks"
+        ).fetchall() == [("blob", 32)]
+
     def test_non_blob_objects_stay_inline(self, store):
         # Trees are always stored inline regardless of size
         blob = Blob.from_string(b"content")
@@ -133,6 +143,47 @@ class TestDeduplication:
         # Should have some dedup: unique chunks < total references
         assert unique_chunks < total_refs
 
+    def test_repeated_chunks_within_blob(self, store, monkeypatch):
+        built = []
+        chunk_row = store._chunk_row
+        monkeypatch.setattr(
+            store,
+            "_chunk_row",
+            lambda sha, data, *args: built.append(sha) or chunk_row(sha, data, *args),
+        )
+        block = b"".join(f"repeated paragraph line {i}\n".encode() for i in range(40))
+        data = block * 20
+        blob = Blob.from_string(data)
+        store.add_object(blob)
+        # Each distinct chunk is compressed and inserted exactly once
+        assert len(built) == len(set(built))
+        assert len(built) == store._conn.execute(
+            "SELECT count(*) FROM chunks"
+        ).fetchone()[0]
+        _, retrieved = store.get_raw(blob.id)
+        assert retrieved == data
+        (refs,) = store._conn.execute(
+            "SELECT chunk_refs FROM objects WHERE chunk_refs IS NOT NULL"
+        ).fetchone()
+        rowids = unpack_chunk_refs(bytes(refs))
+        assert len(set(rowids)) < len(rowids)
+
+    def test_missing_chunk_raises(self, store):
+        data = b"".join(f"line {i} of a chunked blob\n".encode() for i in range(2000))
+        blob = Blob.from_string(data)
+        store.add_object(blob)
+        store._conn.execute(
+            "DELETE FROM chunks WHERE rowid = (SELECT max(rowid) FROM chunks)"
+        )
+        store._conn.commit()
+        with pytest.raises(KeyError):
+            store.get_raw(blob.id)
+        with pytest.raises(KeyError):
+            store.get_raw_range(blob.id, 0, 10)
+        _, stream = store.open_raw(blob.id)
+        with stream, pytest.raises(KeyError):
+            stream.read()
+
     def test_replace_semantics(self, store):
         """Adding the same object twice should work cleanly."""
         data = b"".join(f"line {i}\n".encode() for i in range(500))
@@ -198,6 +249,24 @@ class TestSearchContent:
         assert blob_with_underscore.id in results
         assert blob_no_match.id not in results
 
+    def test_search_is_ascii_case_insensitive(self, store):
+        blob = Blob.from_string(b"MixedCase token")
+        store.add_object(blob)
+        assert blob.id in store.search_content("MixedCase")
+        assert blob.id in store.search_content("mixedcase")
+        assert blob.id in store.search_content("MIXEDCASE TOKEN")
+
+    def test_search_boundary_scan_is_case_insensitive(self, store):
+        data = _large_text("padding", n=300) + b"NeEdLe" + _large_text("filler", n=300)
+        blob = Blob.from_string(data)
+        store.add_object(blob)
+        assert blob.id in store.search_content("needle")
+
+    def test_search_non_utf8_content(self, store):
+        blob = Blob.from_string(b"prefix \xff\xfe marker suffix")
+        store.add_object(blob)
+        assert blob.id in store.search_content("\udcff\udcfe marker")
+
     def test_search_boundary_spanning_match(self, store):
         """Query that spans a chunk boundary is found."""
         # Build data where "NEEDLE" spans the boundary between chunks.
@@ -221,6 +290,14 @@ class TestSearchContent:
         results = store.search_content("NEEDLE")
         assert blob.id in results
 
+    def test_search_match_spanning_whole_chunk(self, store):
+        """A query longer than a chunk, spanning three chunks, is found."""
+        data = b"".join(b"row %d\n" % i for i in range(2000))
+        blob = Blob.from_string(data)
+        store.add_object(blob)
+        query = b"".join(b"row %d\n" % i for i in range(1000, 1060))
+        assert blob.id in store.search_content(query.decode())
+
     def test_search_limit_deterministic(self, store):
         """Results with limit are deterministic (sorted)."""
         blobs = []
@@ -55,6 +55,24 @@ class TestGetObjectSize:
             store.get_object_size(b"a" * 40)
 
 
+class TestIter:
+    def test_iter_is_a_snapshot(self):
+        conn = sqlite3.connect(":memory:")
+        init_db(conn)
+        store = SqliteObjectStore(conn)
+        try:
+            blobs = [Blob.from_string(b"blob %d" % i) for i in range(5)]
+            store.add_objects([(b, None) for b in blobs])
+            seen = []
+            for i, sha in enumerate(store):
+                seen.append(sha)
+                store.add_object(Blob.from_string(b"added %d" % i))
+            assert sorted(seen) == sorted(b.id for b in blobs)
+        finally:
+            store.close()
+            conn.close()
+
+
 class TestAddObjectsRollback:
     @pytest.fixture
     def store(self):
@@ -80,3 +98,73 @@ class TestAddObjectsRollback:
             store.add_objects(objects)
 
         assert not store.contains_loose(good_blob.id)
+
+
+def test_tune_applies_pragmas(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "tuned.db"))
+    init_db(conn)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    store = SqliteObjectStore(conn, tune=True)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+    store.close()
+    conn.close()
+
+
+class TestBatch:
+    @pytest.fixture
+    def store(self, tmp_path):
+        conn = sqlite3.connect(str(tmp_path / "batch.db"))
+        init_db(conn)
+        s = SqliteObjectStore(conn)
+        yield s
+        s.close()
+        conn.close()
+
+    def test_commits_on_exit(self, store):
+        blobs = [Blob.from_string(b"batched %d" % i) for i in range(5)]
+        with store.batch():
+            for blob in blobs:
+                store.add_object(blob)
+            assert store._conn.in_transaction
+        assert not store._conn.in_transaction
+        assert all(store.contains_loose(b.id) for b in blobs)
+
+    def test_rolls_back_on_error(self, store):
+        blob = Blob.from_string(b"never committed")
+        with pytest.raises(RuntimeError):
+            with store.batch():
+                store.add_object(blob)
+                store.add_objects([(Blob.from_string(b"nested"), None)])
+                raise RuntimeError("abort")
+        assert not store.contains_loose(blob.id)
+
+
+def test_add_pack_resolves_deltas():
+    from dulwich.objects import Commit, Tree
+    from dulwich.pack import write_pack_objects
+
+    conn = sqlite3.connect(":memory:")
+    init_db(conn)
+    store = SqliteObjectStore(conn)
+    base = b"".join(b"line %d of a delta base\n" % i for i in range(400))
+    blobs = [Blob.from_string(base + b"revision %d\n" % i) for i in range(5)]
+    tree = Tree()
+    for i, blob in enumerate(blobs):
+        tree.add(b"file%d" % i, 0o100644, blob.id)
+    commit = Commit()
+    commit.tree = tree.id
+    commit.author = commit.committer = b"A <a@b.c>"
+    commit.author_time = commit.commit_time = 0
+    commit.author_timezone = commit.commit_timezone = 0
+    commit.message = b"packed"
+    objects = [*blobs, tree, commit]
+
+    f, finish, _ = store.add_pack()
+    write_pack_objects(f.write, objects, store.object_format, deltify=True)
+    finish()
+
+    for obj in objects:
+        assert store.get_raw(obj.id) == (obj.type_num, obj.as_raw_string())
+    store.close()
+    conn.close()
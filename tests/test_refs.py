@@ -115,6 +115,29 @@ class TestSqliteRefsContainer:
         assert refs_container.read_loose_ref(b"refs/heads/nonexistent") is None
 
 
+    def test_open_transaction_left_to_caller(self, refs_container):
+        conn = refs_container._conn
+        conn.execute("INSERT INTO metadata (key, value) VALUES ('pending', 'x')")
+        refs_container.set_if_equals(b"refs/heads/main", None, b"a" * 40)
+        assert conn.in_transaction
+        with pytest.raises(ValueError):
+            refs_container._logger = _raise_value_error
+            refs_container.set_if_equals(
+                b"refs/heads/other", None, b"b" * 40, message=b"fails"
+            )
+        assert conn.in_transaction
+        assert b"refs/heads/other" not in refs_container.allkeys()
+        conn.rollback()
+        assert b"refs/heads/main" not in refs_container.allkeys()
+        assert conn.execute(
+            "SELECT count(*) FROM metadata WHERE key = 'pending'"
+        ).fetchone()[0] == 0
+
+
+def _raise_value_error(*args, **kwargs):
+    raise ValueError("logger failed")
+
+
 class TestReflog:
     """Verify that reflog entries are written on ref mutations."""
 
@@ -172,6 +195,25 @@ class TestReflog:
         assert log[0][1] == sha
         assert log[0][2] == ZERO_SHA
 
+    @pytest.mark.parametrize("has_returning", [True, False])
+    def test_remove_if_equals_unconditional_logs_old_value(
+        self, logged_refs, monkeypatch, has_returning
+    ):
+        import dulwich_sqlite.refs
+
+        monkeypatch.setattr(dulwich_sqlite.refs, "_HAS_RETURNING", has_returning)
+        container, log = logged_refs
+        sha = b"a" * 40
+        container.set_if_equals(b"refs/heads/main", None, sha, message=b"init")
+        log.clear()
+        assert container.remove_if_equals(b"refs/heads/main", None, message=b"rm")
+        assert container.remove_if_equals(b"refs/heads/main", None, message=b"rm")
+        assert len(log) == 1
+        assert log[0][1] == sha
+        assert log[0][2] == ZERO_SHA
+        assert b"refs/heads/main" not in container.allkeys()
+        assert not container._conn.in_transaction
+
     def test_set_symbolic_ref_logs(self, logged_refs):
         container, log = logged_refs
         sha = b"a" * 40
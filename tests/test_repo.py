@@ -26,6 +26,48 @@ class TestSqliteRepo:
         assert repo2.bare is True
         repo2.close()
 
+    def test_init_bare_commits_settings_and_files(self, tmp_db_path):
+        repo = SqliteRepo.init_bare(tmp_db_path, compress="zlib")
+        try:
+            assert not repo._conn.in_transaction
+            other = sqlite3.connect(tmp_db_path)
+            try:
+                paths = {r[0] for r in other.execute("SELECT path FROM named_files")}
+                method = other.execute(
+                    "SELECT value FROM metadata WHERE key = 'compression'"
+                ).fetchone()[0]
+            finally:
+                other.close()
+            assert {"description", "config"} <= paths
+            assert method == "zlib"
+            assert repo.object_store._compression == "zlib"
+        finally:
+            repo.close()
+
+    def test_init_bare_runs_subclass_init(self, tmp_db_path):
+        class TaggedRepo(SqliteRepo):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.tagged = True
+
+        repo = TaggedRepo.init_bare(tmp_db_path)
+        try:
+            assert isinstance(repo, TaggedRepo)
+            assert repo.tagged
+        finally:
+            repo.close()
+
+    def test_init_bare_pragmas(self, sqlite_repo):
+        conn = sqlite_repo._conn
+        assert conn.execute("PRAGMA page_size").fetchone()[0] == 8192
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+
+    def test_close_twice(self, tmp_db_path):
+        repo = SqliteRepo.init_bare(tmp_db_path)
+        repo.close()
+        repo.close()
+
     def test_description(self, sqlite_repo):
         assert sqlite_repo.get_description() == b"Unnamed repository"
         sqlite_repo.set_description(b"My test repo")
@@ -136,3 +178,56 @@ class TestSqliteRepo:
     def test_read_reflog_empty(self, sqlite_repo):
         entries = list(sqlite_repo.read_reflog(b"refs/heads/nonexistent"))
         assert entries == []
+
+    def test_batch_defers_ref_and_reflog_commits(self, sqlite_repo, tmp_db_path):
+        blob = Blob.from_string(b"data")
+        with sqlite_repo.batch():
+            sqlite_repo.object_store.add_object(blob)
+            for i in range(3):
+                sqlite_repo.refs.set_if_equals(
+                    b"refs/remotes/origin/b%d" % i, None, blob.id, message=b"fetch"
+                )
+            other = sqlite3.connect(tmp_db_path)
+            try:
+                assert other.execute("SELECT count(*) FROM refs").fetchone()[0] == 0
+            finally:
+                other.close()
+        assert sqlite_repo.refs[b"refs/remotes/origin/b2"] == blob.id
+        assert len(list(sqlite_repo.read_reflog(b"refs/remotes/origin/b0"))) == 1
+
+    def test_batch_rolls_back_refs_and_reflog(self, sqlite_repo):
+        blob = Blob.from_string(b"data")
+        sqlite_repo.object_store.add_object(blob)
+        with pytest.raises(RuntimeError):
+            with sqlite_repo.batch():
+                sqlite_repo.refs.set_if_equals(
+                    b"refs/heads/main", None, blob.id, message=b"init"
+                )
+                raise RuntimeError("boom")
+        assert b"refs/heads/main" not in sqlite_repo.refs
+        assert list(sqlite_repo.read_reflog(b"refs/heads/main")) == []
+
+    def test_batch_keeps_writes_around_a_failed_ref_update(self, sqlite_repo):
+        before = Blob.from_string(b"before")
+        after = Blob.from_string(b"after")
+
+        def failing_logger(*args, **kwargs):
+            raise RuntimeError("log failed")
+
+        with sqlite_repo.batch():
+            sqlite_repo.object_store.add_object(before)
+            sqlite_repo.refs.set_if_equals(
+                b"refs/heads/kept", None, before.id, message=b"kept"
+            )
+            sqlite_repo.refs._logger = failing_logger
+            with pytest.raises(RuntimeError):
+                sqlite_repo.refs.set_if_equals(
+                    b"refs/heads/lost", None, before.id, message=b"lost"
+                )
+            sqlite_repo.refs._logger = sqlite_repo._write_reflog
+            sqlite_repo.object_store.add_object(after)
+        assert before.id in sqlite_repo.object_store
+        assert after.id in sqlite_repo.object_store
+        assert sqlite_repo.refs[b"refs/heads/kept"] == before.id
+        assert b"refs/heads/lost" not in sqlite_repo.refs
+        assert len(list(sqlite_repo.read_reflog(b"refs/heads/kept"))) == 1